@@ -0,0 +1,28 @@
+"""model version
+
+Revision ID: 1
+Revises: 0
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "1"
+down_revision = "0"
+branch_labels = None
+depends_on = None
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+def upgrade() -> None:
+    op.add_column(
+        "image_process",
+        sa.Column("model_version", sa.String(), nullable=True, comment="Версия модели, которой обработана задача"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("image_process", "model_version")
@@ -0,0 +1,26 @@
+"""unique task id
+
+Revision ID: 2
+Revises: 1
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "2"
+down_revision = "1"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade() -> None:
+    # Подтверждение загрузки приходит и от клиента, и от события хранилища, запись задачи создаётся один раз
+    op.drop_index(op.f("ix_image_process_task_id"), table_name="image_process")
+    op.create_index(op.f("ix_image_process_task_id"), "image_process", ["task_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_image_process_task_id"), table_name="image_process")
+    op.create_index(op.f("ix_image_process_task_id"), "image_process", ["task_id"], unique=False)
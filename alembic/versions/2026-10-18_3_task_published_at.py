@@ -0,0 +1,39 @@
+"""task published at
+
+Revision ID: 3
+Revises: 2
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "3"
+down_revision = "2"
+branch_labels = None
+depends_on = None
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+def upgrade() -> None:
+    # Повторное подтверждение загрузки публикует задачу, только если прежняя публикация не удалась
+    op.add_column(
+        "image_process",
+        sa.Column(
+            "publish_claimed_at",
+            sa.DateTime(timezone=True),
+            nullable=True,
+            comment="Начало публикации задачи в очередь",
+        ),
+    )
+    op.add_column(
+        "image_process",
+        sa.Column("published_at", sa.DateTime(timezone=True), nullable=True, comment="Задача опубликована в очередь"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("image_process", "published_at")
+    op.drop_column("image_process", "publish_claimed_at")
@@ -1,39 +1,71 @@
 from dataclasses import dataclass
 
+from faststream.rabbit import RabbitBroker
+
 from backend_context.repositories.api_repository import ApiRepository
 from backend_context.repositories.s3_repository import S3Repository
 from backend_context.services.api_service import ApiService
+from backend_context.services.task_event_hub import TaskEventHub
+from backend_context.services.task_router import TaskRouter
+from backend_context.services.task_status_cache import TaskStatusCache
 from backend_context.suppliers.s3_supplier import S3Supplier
 from base.containers.base import Container
-from base.infrastructure.http.session import new_session_from_settings
 from base.infrastructure.pg.client import engine_from_settings_both
 from base.infrastructure.rabbit.session import broker_from_settings
-from base.infrastructure.s3.session import s3_session_from_settings
+from base.infrastructure.s3.presign import S3Presigner
+from base.infrastructure.s3.transfer import S3Transfer
+from base.presentation.rabbit.rabbit_queues import process_image_queues, task_status_exchange
+from base.settings import settings
 
 
 @dataclass(slots=True, frozen=True)
 class ApiContainer(Container):
     api_service: ApiService
+    s3_transfer: S3Transfer
+    broker: RabbitBroker
+    event_hub: TaskEventHub
+    status_cache: TaskStatusCache | None = None
 
     @classmethod
     async def build_from_settings(cls) -> "ApiContainer":
-        http_session = new_session_from_settings()
-        s3_supplier = S3Supplier(_session=http_session)
+        s3_supplier = S3Supplier(_presigner=S3Presigner.from_settings())
 
         pg_rw_client, pg_ro_client = engine_from_settings_both()
         api_repository = ApiRepository(pg_rw_client, pg_ro_client)
-        s3_session = s3_session_from_settings()
-        s3_repository = S3Repository(_s3_session=s3_session)
+        s3_transfer = await S3Transfer.from_settings()
+        s3_repository = S3Repository(_s3_transfer=s3_transfer)
 
         rabbit_broker = broker_from_settings()
         await rabbit_broker.connect()
+        for queue in process_image_queues.values():
+            await rabbit_broker.declare_queue(queue)
+        await rabbit_broker.declare_exchange(task_status_exchange)
+        status_cache = None
+        if settings.task_status_cache.enabled:
+            status_cache = TaskStatusCache(
+                ttl=settings.task_status_cache.ttl,
+                ready_ttl=settings.task_status_cache.ready_ttl,
+                max_entries=settings.task_status_cache.max_entries,
+            )
+        event_hub = TaskEventHub(queue_size=settings.task_events.client_queue_size)
         api_service = ApiService(
             _s3_supplier=s3_supplier,
             _api_repository=api_repository,
             _s3_repository=s3_repository,
             _publisher=rabbit_broker,
+            _task_router=TaskRouter.from_settings(),
+            _event_hub=event_hub,
+            _status_cache=status_cache,
         )
 
         return cls(
             api_service=api_service,
+            s3_transfer=s3_transfer,
+            broker=rabbit_broker,
+            event_hub=event_hub,
+            status_cache=status_cache,
         )
+
+    async def close(self) -> None:
+        await self.broker.close()
+        await self.s3_transfer.close()
@@ -1,6 +1,6 @@
 import enum
 
-from sqlalchemy import UUID, BigInteger, Column, DateTime, Enum, Text
+from sqlalchemy import UUID, BigInteger, Column, DateTime, Enum, String, Text
 
 from base.persistent.pg.base import Base, WithCreatedAt, WithUpdatedAt
 from base.utils.datetime_utils import utcnow
@@ -13,12 +13,24 @@ class ImageProcessing(enum.Enum):
     UNKNOWN = "unknown"
 
 
+# Статусы задачи только растут: смена на статус с меньшим рангом отбрасывается
+STATUS_RANK = {
+    ImageProcessing.UNKNOWN: 0,
+    ImageProcessing.QUEUED: 1,
+    ImageProcessing.PROCESSING: 2,
+    ImageProcessing.READY: 3,
+}
+
+
 class ImageProcess(Base, WithCreatedAt, WithUpdatedAt):
     __tablename__ = "image_process"
 
     id = Column(BigInteger, primary_key=True)
-    task_id = Column(UUID(as_uuid=True), index=True)
+    task_id = Column(UUID(as_uuid=True), index=True, unique=True)
     status = Column(Enum(ImageProcessing), nullable=False, default=ImageProcessing.QUEUED)
+    model_version = Column(String, nullable=True, comment="Версия модели, которой обработана задача")
+    publish_claimed_at = Column(DateTime(timezone=True), nullable=True, comment="Начало публикации задачи в очередь")
+    published_at = Column(DateTime(timezone=True), nullable=True, comment="Задача опубликована в очередь")
 
 
 class PresignedUrl(Base, WithCreatedAt, WithUpdatedAt):
@@ -1,12 +1,17 @@
 import logging
 import uuid
+from collections.abc import AsyncIterator
+from typing import Annotated
 
-from fastapi import APIRouter, FastAPI, File, UploadFile
+from fastapi import APIRouter, FastAPI, File, Query, UploadFile
+from fastapi.responses import StreamingResponse
 
 # from neuro_api_context.settings import settings
 from backend_context.containers.api_container import ApiContainer
-from backend_context.schemas.api_schemas import PresignedUrl, Task
+from backend_context.schemas.api_schemas import PresignedUrl, Task, TaskStatusEvent
+from base.presentation.rabbit.rabbit_queues import task_status_events_queue, task_status_exchange
 from base.presentation.rest.app import create_fastapi_app
+from base.settings import settings
 
 logger = logging.getLogger(__name__)
 
@@ -22,16 +27,56 @@ async def create_app(container: ApiContainer) -> FastAPI:
     ) -> Task:
         return await container.api_service.upload_satellite_images(optical_file=optical_file, sar_file=sar_file)
 
+    # Объявлен до /image/{task_id}, иначе "events" разбирается как task_id
+    @router.get("/image/events", response_class=StreamingResponse)
+    async def stream_image_events(
+        task_id: Annotated[list[uuid.UUID], Query(description="Задачи для отслеживания")],
+    ) -> StreamingResponse:
+        tasks = container.api_service.watch_tasks(task_id, heartbeat=settings.task_events.heartbeat_interval)
+        return StreamingResponse(
+            _server_sent_events(tasks),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     @router.get("/image/{task_id}")
     async def get_image(task_id: uuid.UUID) -> Task:
         return await container.api_service.get_image_by_task_id(task_id=task_id)
 
+    @router.post("/image/{task_id}/confirm")
+    async def confirm_upload(task_id: uuid.UUID) -> Task:
+        return await container.api_service.confirm_upload(task_id=task_id)
+
     @router.get("/get-presigned-url")
     async def get_presigned_url() -> PresignedUrl:
         return await container.api_service.get_presigned_url()
 
+    await _subscribe_task_events(container)
+
     app = create_fastapi_app()
     app.include_router(router)
     router.include_router(mock_router)
+    app.add_event_handler("shutdown", container.close)
 
     return app
+
+
+async def _subscribe_task_events(container: ApiContainer) -> None:
+    # Каждый процесс API получает все события задач одной временной очередью
+    @container.broker.subscriber(task_status_events_queue(), exchange=task_status_exchange, no_ack=True)
+    async def on_task_status_changed(events: list[TaskStatusEvent]) -> None:
+        for event in events:
+            if container.status_cache is not None:
+                container.status_cache.apply(event)
+            container.event_hub.publish(event)
+
+    await container.broker.start()
+
+
+async def _server_sent_events(tasks: AsyncIterator[Task | None]) -> AsyncIterator[str]:
+    async for task in tasks:
+        if task is None:
+            # Комментарий не даёт прокси закрыть простаивающее соединение
+            yield ": keep-alive\n\n"
+            continue
+        yield f"event: task\ndata: {task.model_dump_json()}\n\n"
@@ -1,8 +1,9 @@
 import logging
 import uuid
 from dataclasses import dataclass
+from datetime import timedelta
 
-from sqlalchemy import select
+from sqlalchemy import or_, select, update
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
@@ -11,6 +12,7 @@ from backend_context.persistent.pg.api import ImageProcessing
 from backend_context.persistent.pg.api import PresignedUrl as PresignedUrlRecord
 from backend_context.schemas.api_schemas import PresignedUrl as PresignedUrlDTO
 from backend_context.schemas.api_schemas import Task
+from base.utils.datetime_utils import utcnow
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +26,8 @@ class ApiRepository:
         stmt = (
             insert(PresignedUrlRecord)
             .values(
-                url=url.url,
+                id=url.task_id,
+                url=url.model_dump_json(include={"optical_url", "sar_url"}),
                 expires_at=url.expires_date,
             )
             .returning(PresignedUrlRecord.id)
@@ -38,20 +41,69 @@ class ApiRepository:
         return True
 
     async def add_task(self, task_id: uuid.UUID) -> bool:
-        stmt = insert(ImageProcessRecord).values(task_id=task_id).returning(ImageProcessRecord.id)
+        """
+        False, если задача уже есть: повторное подтверждение загрузки не создаёт вторую запись
+
+        Новая задача сразу захвачена под публикацию (claim_publish) вызывающим.
+        """
+        stmt = (
+            insert(ImageProcessRecord)
+            .values(task_id=task_id, publish_claimed_at=utcnow())
+            .on_conflict_do_nothing(index_elements=[ImageProcessRecord.task_id])
+            .returning(ImageProcessRecord.id)
+        )
         async with self._engine_rw() as session:
             res = (await session.execute(stmt)).first()
             await session.commit()
         if res is None:
-            logger.warning("task.not.saved", extra={"task_id": task_id})
+            logger.info("task.already.exists", extra={"task_id": task_id})
             return False
         return True
 
-    async def get_task_by_id(self, task_id: uuid.UUID) -> Task:
-        stmt = select(ImageProcessRecord).where(ImageProcessRecord.task_id == task_id)
-        async with self._engine_ro() as session:
+    async def claim_publish(self, task_id: uuid.UUID, lease: timedelta) -> bool:
+        """
+        Захват публикации задачи в QUEUED, которая ещё не опубликована
+
+        Захват другого вызова дольше lease считается оборванным (процесс упал
+        между захватом и публикацией). Из конкурирующих вызовов захват получает один.
+        """
+        now = utcnow()
+        stmt = (
+            update(ImageProcessRecord)
+            .where(
+                ImageProcessRecord.task_id == task_id,
+                ImageProcessRecord.status == ImageProcessing.QUEUED,
+                ImageProcessRecord.published_at.is_(None),
+                or_(
+                    ImageProcessRecord.publish_claimed_at.is_(None),
+                    ImageProcessRecord.publish_claimed_at < now - lease,
+                ),
+            )
+            .values(publish_claimed_at=now)
+            .returning(ImageProcessRecord.id)
+        )
+        async with self._engine_rw() as session:
+            res = (await session.execute(stmt)).first()
+            await session.commit()
+        return res is not None
+
+    async def finish_publish(self, task_id: uuid.UUID, published: bool) -> None:
+        """Отметка успешной публикации или снятие захвата, чтобы следующее подтверждение опубликовало снова"""
+        values = {"published_at": utcnow()} if published else {"publish_claimed_at": None}
+        stmt = update(ImageProcessRecord).where(ImageProcessRecord.task_id == task_id).values(**values)
+        async with self._engine_rw() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def get_task_by_id(self, task_id: uuid.UUID, from_primary: bool = False) -> Task:
+        """from_primary читает с основной базы, когда отставание реплики недопустимо"""
+        # Только нужные колонки, без загрузки ORM-объекта
+        stmt = select(ImageProcessRecord.task_id, ImageProcessRecord.status, ImageProcessRecord.model_version).where(
+            ImageProcessRecord.task_id == task_id
+        )
+        engine = self._engine_rw if from_primary else self._engine_ro
+        async with engine() as session:
             res = (await session.execute(stmt)).first()
         if res is None:
             return Task(task_id=None, status=ImageProcessing.UNKNOWN, s3_url=None)
-        data = res[0]
-        return Task(task_id=data.task_id, status=data.status, s3_url=None)
+        return Task(task_id=res.task_id, status=res.status, s3_url=None, model_version=res.model_version)
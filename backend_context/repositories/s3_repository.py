@@ -1,24 +1,71 @@
+import asyncio
 import logging
 import uuid
+from collections.abc import Awaitable, Callable
 from dataclasses import dataclass
 
-from aioboto3 import Session
+import botocore.exceptions
 
+from base.infrastructure.s3.transfer import S3Transfer
 from base.settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(slots=True, frozen=True)
 class S3Repository:
-    _s3_session: Session
-
-    async def upload_images(self, task_id: uuid.UUID, optical_content: bytes, sar_content: bytes) -> None:
-        async with self._s3_session.client("s3", endpoint_url=settings.s3_config.endpoint_url) as s3:
-            optical_key = self._build_key(task_id=task_id, key_name="optical.tif")
-            await s3.put_object(Bucket=settings.s3_config.bucket_name, Key=optical_key, Body=optical_content)
-            logging.info("loaded.optical.image", extra={"task_id": task_id})
-            sar_key = self._build_key(task_id=task_id, key_name="sar.tif")
-            await s3.put_object(Bucket=settings.s3_config.bucket_name, Key=sar_key, Body=sar_content)
-            logging.info("loaded.sar.image", extra={"task_id": task_id})
+    _s3_transfer: S3Transfer
+
+    async def upload_images(
+        self,
+        task_id: uuid.UUID,
+        read_optical: Callable[[int], Awaitable[bytes]],
+        read_sar: Callable[[int], Awaitable[bytes]],
+        memory_budget_bytes: int,
+    ) -> int:
+        """
+        Потоковая загрузка обоих снимков одновременно, возвращает их суммарный размер
+
+        memory_budget_bytes делится между файлами поровну, каждому не меньше одной части.
+        """
+        parts_in_flight = max(1, memory_budget_bytes // (2 * settings.s3_config.part_size_bytes))
+        optical_size, sar_size = await asyncio.gather(
+            self._s3_transfer.put_stream(
+                self._build_key(task_id=task_id, key_name="optical.tif"), read_optical, parts_in_flight
+            ),
+            self._s3_transfer.put_stream(
+                self._build_key(task_id=task_id, key_name="sar.tif"), read_sar, parts_in_flight
+            ),
+        )
+        logger.info("loaded.optical.image", extra={"task_id": task_id, "size_bytes": optical_size})
+        logger.info("loaded.sar.image", extra={"task_id": task_id, "size_bytes": sar_size})
+        return optical_size + sar_size
+
+    async def get_uploaded_images(self, task_id: uuid.UUID, header_bytes: int) -> tuple[bytes, int] | None:
+        """
+        Начало оптического снимка и суммарный размер снимков, загруженных по PUT-ссылкам
+
+        None, если хотя бы одного снимка ещё нет.
+        """
+        optical_key = self._build_key(task_id=task_id, key_name="optical.tif")
+        try:
+            optical, sar = await asyncio.gather(
+                self._s3_transfer.head(optical_key),
+                self._s3_transfer.head(self._build_key(task_id=task_id, key_name="sar.tif")),
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+        size_bytes = optical["ContentLength"] + sar["ContentLength"]
+        if optical["ContentLength"] == 0:
+            return b"", size_bytes
+        response = await self._s3_transfer.client.get_object(
+            Bucket=self._s3_transfer.bucket, Key=optical_key, Range=f"bytes=0-{header_bytes - 1}"
+        )
+        async with response["Body"] as stream:
+            return await stream.read(), size_bytes
 
     def _build_key(self, task_id: uuid.UUID, key_name: str) -> str:
         return self._build_s3_path(task_id=task_id) + key_name
@@ -6,7 +6,9 @@ from base.schemas.base import PureBaseModel
 
 
 class PresignedUrl(PureBaseModel):
-    url: str
+    # PUT-ссылки для загрузки снимков напрямую в хранилище
+    optical_url: str
+    sar_url: str
     task_id: uuid.UUID
     expires_date: datetime.datetime
 
@@ -15,3 +17,13 @@ class Task(PureBaseModel):
     task_id: uuid.UUID | None
     status: ImageProcessing
     s3_url: str | None
+    model_version: str | None = None
+    # Доля готовых тайлов в PROCESSING, известна только по событиям воркера
+    progress: float | None = None
+
+
+class TaskStatusEvent(PureBaseModel):
+    task_id: uuid.UUID
+    status: ImageProcessing
+    model_version: str | None = None
+    progress: float | None = None
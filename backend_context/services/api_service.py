@@ -1,6 +1,9 @@
+import asyncio
 import logging
 import uuid
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
+from datetime import timedelta
 from urllib.parse import urljoin
 
 from fastapi import UploadFile
@@ -9,11 +12,16 @@ from faststream.rabbit import RabbitBroker
 from backend_context.persistent.pg.api import ImageProcessing
 from backend_context.repositories.api_repository import ApiRepository
 from backend_context.repositories.s3_repository import S3Repository
-from backend_context.schemas.api_schemas import PresignedUrl, Task
+from backend_context.schemas.api_schemas import PresignedUrl, Task, TaskStatusEvent
+from backend_context.services.task_event_hub import TaskEventHub
+from backend_context.services.task_router import TaskRouter
+from backend_context.services.task_status_cache import TaskStatusCache
 from backend_context.suppliers.s3_supplier import S3Supplier
-from base.presentation.rabbit.rabbit_queues import process_image_queue
+from base.exceptions import ClientError
 from base.settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(slots=True, frozen=True)
 class ApiService:
@@ -21,35 +29,152 @@ class ApiService:
     _api_repository: ApiRepository
     _s3_repository: S3Repository
     _publisher: RabbitBroker
+    _task_router: TaskRouter
+    _event_hub: TaskEventHub
+    _status_cache: TaskStatusCache | None = None
 
     async def get_presigned_url(self) -> PresignedUrl:
         task_id = uuid.uuid4()
         url = await self._s3_supplier.get_presigned_url(task_id)
-        await self._api_repository.add_presigned_url(url)
+        if settings.presign.store_urls:
+            await self._api_repository.add_presigned_url(url)
         return url
 
+    async def confirm_upload(self, task_id: uuid.UUID) -> Task:
+        """
+        Постановка в очередь задачи, снимки которой загружены по PUT-ссылкам
+
+        Вызывается и клиентом, и событием хранилища, поэтому задача публикуется
+        один раз: повторное подтверждение публикует её снова, только если прежняя
+        публикация не удалась или оборвалась (захват старше publish_lease).
+        Иначе возвращается текущее состояние задачи.
+        """
+        uploaded = await self._s3_repository.get_uploaded_images(
+            task_id=task_id, header_bytes=settings.image_upload.header_bytes
+        )
+        if uploaded is None:
+            raise ClientError(f"Images of task {task_id} are not uploaded")
+        if not await self._api_repository.add_task(task_id=task_id) and not await self._api_repository.claim_publish(
+            task_id, lease=settings.image_upload.publish_lease
+        ):
+            task = await self._api_repository.get_task_by_id(task_id, from_primary=True)
+            if ImageProcessing(task.status) == ImageProcessing.READY:
+                task.s3_url = await self._make_url_to_image(task_id)
+            return task
+
+        optical_header, size_bytes = uploaded
+        try:
+            await self._send_task_in_queue(task_id=task_id, optical_header=optical_header, size_bytes=size_bytes)
+        except Exception:
+            await self._api_repository.finish_publish(task_id, published=False)
+            raise
+        await self._api_repository.finish_publish(task_id, published=True)
+        task = Task(task_id=task_id, status=ImageProcessing.QUEUED, s3_url=None)
+        if self._status_cache is not None:
+            self._status_cache.put(task)
+        return task
+
     async def get_image_by_task_id(self, task_id: uuid.UUID) -> Task:
-        task = await self._api_repository.get_task_by_id(task_id)
-        if task.status == ImageProcessing.READY:
+        if self._status_cache is None:
+            task = await self._api_repository.get_task_by_id(task_id)
+        else:
+            task = await self._status_cache.get(task_id, self._api_repository.get_task_by_id)
+        # status хранится значением перечисления (use_enum_values)
+        if ImageProcessing(task.status) == ImageProcessing.READY:
             task.s3_url = await self._make_url_to_image(task_id)
         return task
 
+    def watch_tasks(self, task_ids: list[uuid.UUID], heartbeat: timedelta) -> AsyncIterator[Task | None]:
+        """
+        Текущее состояние задач, затем их смены статусов и прогресс до READY
+
+        Подписка оформляется до чтения состояния, поэтому смена между чтением и
+        подпиской не теряется. Неизвестные задачи отдаются один раз со статусом
+        UNKNOWN. None означает, что за heartbeat событий не было. Список задач
+        проверяется сразу, до начала ответа.
+        """
+        unique = list(dict.fromkeys(task_ids))
+        if not 0 < len(unique) <= settings.task_events.max_task_ids:
+            raise ClientError(f"Expected 1..{settings.task_events.max_task_ids} task ids, got {len(unique)}")
+        return self._watch_tasks(unique, heartbeat)
+
+    async def _watch_tasks(self, task_ids: list[uuid.UUID], heartbeat: timedelta) -> AsyncIterator[Task | None]:
+        async with self._event_hub.subscribe(task_ids) as events:
+            pending: set[uuid.UUID] = set()
+            for task_id in task_ids:
+                task = await self.get_image_by_task_id(task_id)
+                task.task_id = task_id
+                if not _is_final(task):
+                    pending.add(task_id)
+                yield task
+
+            while pending:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=heartbeat.total_seconds())
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event.task_id not in pending:
+                    continue
+                task = await self._task_from_event(event)
+                if _is_final(task):
+                    pending.discard(event.task_id)
+                yield task
+
     async def upload_satellite_images(self, optical_file: UploadFile, sar_file: UploadFile) -> Task:
         task_id = uuid.uuid4()
         await self._api_repository.add_task(task_id=task_id)
-        optical_content, sar_content = await optical_file.read(), await sar_file.read()
-        await self._s3_repository.upload_images(
-            task_id=task_id, optical_content=optical_content, sar_content=sar_content
+        # Файлы целиком в память не читаются, заголовок нужен только для выбора очереди
+        optical_header = await optical_file.read(settings.image_upload.header_bytes)
+        await optical_file.seek(0)
+        size_bytes = await self._s3_repository.upload_images(
+            task_id=task_id,
+            read_optical=optical_file.read,
+            read_sar=sar_file.read,
+            memory_budget_bytes=settings.image_upload.memory_budget_bytes,
         )
-        await self._send_task_in_queue(task_id=task_id)
+        await self._send_task_in_queue(task_id=task_id, optical_header=optical_header, size_bytes=size_bytes)
+        await self._api_repository.finish_publish(task_id, published=True)
         await optical_file.close()
         await sar_file.close()
-        return Task(task_id=task_id, status=ImageProcessing.QUEUED, s3_url=None)
+        task = Task(task_id=task_id, status=ImageProcessing.QUEUED, s3_url=None)
+        if self._status_cache is not None:
+            self._status_cache.put(task)
+        return task
+
+    async def _send_task_in_queue(self, task_id: uuid.UUID, optical_header: bytes, size_bytes: int) -> None:
+        route = self._task_router.route(optical_header=optical_header, size_bytes=size_bytes)
+        await self._publisher.publish(str(task_id), queue=route.queue, priority=route.priority)
+        logger.info(
+            "task.queued",
+            extra={
+                "task_id": task_id,
+                "queue": route.queue.name,
+                "priority": route.priority,
+                "pixels": route.pixels,
+                "size_bytes": route.size_bytes,
+            },
+        )
 
-    async def _send_task_in_queue(self, task_id: uuid.UUID) -> None:
-        await self._publisher.publish(str(task_id), queue=process_image_queue)
-        logging.info("task.queued", extra={"task_id": task_id})
+    async def _task_from_event(self, event: TaskStatusEvent) -> Task:
+        task = Task(
+            task_id=event.task_id,
+            status=event.status,
+            s3_url=None,
+            model_version=event.model_version,
+            progress=event.progress,
+        )
+        if ImageProcessing(task.status) == ImageProcessing.READY:
+            task.s3_url = await self._make_url_to_image(event.task_id)
+        return task
 
     async def _make_url_to_image(self, task_id: uuid.UUID) -> str:
+        if settings.presign.result_urls:
+            return self._s3_supplier.get_result_url(task_id)
         base_url = urljoin(settings.s3_config.endpoint_url, settings.s3_config.bucket_name)
         return urljoin(base_url, str(task_id)) + "result.tif"
+
+
+def _is_final(task: Task) -> bool:
+    """После READY событий по задаче не будет, UNKNOWN означает, что задачи нет"""
+    return ImageProcessing(task.status) in (ImageProcessing.READY, ImageProcessing.UNKNOWN)
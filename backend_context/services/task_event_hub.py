@@ -0,0 +1,59 @@
+import asyncio
+import contextlib
+import uuid
+from collections.abc import AsyncIterator
+
+from backend_context.schemas.api_schemas import TaskStatusEvent
+
+
+class TaskEventHub:
+    def __init__(self, queue_size: int):
+        """
+        Раздача событий задач подписчикам внутри одного процесса API
+
+        Процесс держит одну подписку на обменник статусов, hub раскладывает события
+        по очередям клиентов, подписанных на task_id. Очередь клиента ограничена
+        queue_size: медленный клиент теряет самые старые события, а не копит память,
+        последнее событие задачи (READY) до него всегда доходит.
+        """
+        if queue_size <= 0:
+            raise ValueError(f"Client queue size must be positive, got {queue_size}")
+
+        self._queue_size = queue_size
+        self._subscribers: dict[uuid.UUID, set[asyncio.Queue[TaskStatusEvent]]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, task_ids: list[uuid.UUID]) -> AsyncIterator[asyncio.Queue[TaskStatusEvent]]:
+        queue: asyncio.Queue[TaskStatusEvent] = asyncio.Queue(maxsize=self._queue_size)
+        for task_id in task_ids:
+            self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            for task_id in task_ids:
+                subscribers = self._subscribers.get(task_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    def publish(self, event: TaskStatusEvent) -> None:
+        self.published += 1
+        for queue in self._subscribers.get(event.task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+            self.delivered += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "subscribed_tasks": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
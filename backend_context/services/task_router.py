@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+
+from faststream.rabbit import RabbitQueue
+
+from base.presentation.rabbit.rabbit_queues import process_image_queues
+from base.settings import TaskSize, settings
+from base.utils.tiff import tiff_dimensions
+
+
+@dataclass(frozen=True, slots=True)
+class TaskRoute:
+    size: TaskSize
+    queue: RabbitQueue
+    priority: int | None
+    pixels: int | None
+    size_bytes: int
+
+
+@dataclass(frozen=True, slots=True)
+class TaskRouter:
+    """
+    Выбор очереди по размеру входов
+
+    Большие сцены уходят в отдельную очередь со своими воркерами и не задерживают
+    маленькие интерактивные задачи. Размер берётся из заголовка оптического GeoTIFF
+    в пикселях, если заголовок не разобран - по суммарному объёму входов в байтах.
+    """
+
+    _large_task_pixels: int
+    _large_task_bytes: int
+    # 0 - очереди без приоритетов
+    _max_priority: int
+
+    @classmethod
+    def from_settings(cls) -> "TaskRouter":
+        conf = settings.task_routing
+        return cls(
+            _large_task_pixels=conf.large_task_pixels,
+            _large_task_bytes=conf.large_task_bytes,
+            _max_priority=conf.max_priority,
+        )
+
+    def route(self, optical_header: bytes, size_bytes: int) -> TaskRoute:
+        dimensions = tiff_dimensions(optical_header)
+        pixels = dimensions[0] * dimensions[1] if dimensions is not None else None
+        if pixels is not None:
+            load = pixels / self._large_task_pixels
+        else:
+            load = size_bytes / self._large_task_bytes
+        size = TaskSize.LARGE if load > 1 else TaskSize.SMALL
+        return TaskRoute(
+            size=size,
+            queue=process_image_queues[size],
+            priority=self._priority(load) if self._max_priority else None,
+            pixels=pixels,
+            size_bytes=size_bytes,
+        )
+
+    def _priority(self, load: float) -> int:
+        # Чем меньше сцена относительно порога своей очереди, тем выше приоритет
+        fraction = load if load <= 1 else min(load / 16, 1.0)
+        return round(self._max_priority * (1 - fraction))
@@ -0,0 +1,105 @@
+import asyncio
+import collections
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import timedelta
+
+from backend_context.persistent.pg.api import STATUS_RANK, ImageProcessing
+from backend_context.schemas.api_schemas import Task, TaskStatusEvent
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Entry:
+    task: Task
+    expires_at: float
+
+
+class TaskStatusCache:
+    def __init__(self, ttl: timedelta, ready_ttl: timedelta, max_entries: int):
+        """
+        Кэш статусов задач для опроса GET /v1/image/{task_id}
+
+        Незавершённые и неизвестные задачи живут ttl, готовые - ready_ttl.
+        Одновременные промахи по одной задаче ждут один запрос в БД.
+        События смены статуса от воркеров обновляют закэшированные записи,
+        поэтому короткий ttl нужен только на случай потерянного события.
+        """
+        self._ttl = ttl.total_seconds()
+        self._ready_ttl = ready_ttl.total_seconds()
+        self._max_entries = max_entries
+        self._entries: collections.OrderedDict[uuid.UUID, _Entry] = collections.OrderedDict()
+        self._loading: dict[uuid.UUID, asyncio.Future[Task]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, task_id: uuid.UUID, load: Callable[[uuid.UUID], Awaitable[Task]]) -> Task:
+        entry = self._entries.get(task_id)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return entry.task.model_copy()
+
+        loading = self._loading.get(task_id)
+        if loading is None:
+            self.misses += 1
+            # Отдельная задача: отмена одного опрашивающего не отменяет запрос остальных
+            loading = asyncio.ensure_future(self._load(task_id, load))
+            self._loading[task_id] = loading
+        else:
+            self.coalesced += 1
+        return (await asyncio.shield(loading)).model_copy()
+
+    def put(self, task: Task) -> None:
+        if task.task_id is not None:
+            self._store(task.task_id, task)
+
+    def apply(self, event: TaskStatusEvent) -> None:
+        """Обновляет запись, если задача закэширована или загружается, иначе событие никому не нужно"""
+        entry = self._entries.get(event.task_id)
+        if entry is None and event.task_id not in self._loading:
+            return
+        model_version = event.model_version or (entry.task.model_version if entry is not None else None)
+        self._store(
+            event.task_id,
+            Task(
+                task_id=event.task_id,
+                status=event.status,
+                s3_url=None,
+                model_version=model_version,
+                progress=event.progress,
+            ),
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._entries)}
+
+    async def _load(self, task_id: uuid.UUID, load: Callable[[uuid.UUID], Awaitable[Task]]) -> Task:
+        try:
+            task = await load(task_id)
+            return self._store(task_id, task)
+        finally:
+            del self._loading[task_id]
+
+    def _store(self, task_id: uuid.UUID, task: Task) -> Task:
+        status = ImageProcessing(task.status)
+        current = self._entries.get(task_id)
+        # Чтение с реплики может отстать от события воркера
+        if current is not None:
+            current_status = ImageProcessing(current.task.status)
+            if STATUS_RANK[current_status] > STATUS_RANK[status]:
+                task, status = current.task, current_status
+            elif current_status == status and task.progress is None:
+                task = task.model_copy(update={"progress": current.task.progress})
+
+        ttl = self._ready_ttl if status == ImageProcessing.READY else self._ttl
+        self._entries[task_id] = _Entry(task=task, expires_at=time.monotonic() + ttl)
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return task
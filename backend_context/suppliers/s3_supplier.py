@@ -1,26 +1,28 @@
-import json
 import uuid
 from dataclasses import dataclass
 
-from aiohttp import ClientSession
-
 from backend_context.schemas.api_schemas import PresignedUrl
+from base.infrastructure.s3.presign import S3Presigner
 from base.settings import settings
+from base.utils.datetime_utils import utcnow
 
 
 @dataclass(slots=True, frozen=True, kw_only=True)
 class S3Supplier:
-    _session: ClientSession
+    _presigner: S3Presigner
 
     async def get_presigned_url(self, task_id: uuid.UUID) -> PresignedUrl:
-        payload = {"bucket_name": settings.s3_config.bucket_name, "task_id": str(task_id), "expires_in": 3600}
-        async with self._session.get(
-            settings.s3_config.generate_presigned_url_endpoint,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-        ) as response:
-            response.raise_for_status()
-            data = json.loads(await response.text())
-            presigned_url = data.get("presigned_url")
-            expiration_datetime = data.get("expiration_time")
-            return PresignedUrl(url=presigned_url, task_id=task_id, expires_date=expiration_datetime)
+        now = utcnow()
+        expires = settings.presign.expires
+        return PresignedUrl(
+            optical_url=self._presigner.presign("PUT", self._build_key(task_id, "optical.tif"), expires, now=now),
+            sar_url=self._presigner.presign("PUT", self._build_key(task_id, "sar.tif"), expires, now=now),
+            task_id=task_id,
+            expires_date=now + expires,
+        )
+
+    def get_result_url(self, task_id: uuid.UUID) -> str:
+        return self._presigner.presign("GET", self._build_key(task_id, "result.tif"), settings.presign.expires)
+
+    def _build_key(self, task_id: uuid.UUID, key_name: str) -> str:
+        return f"{settings.s3_config.bucket_name}/uploads/{task_id}/{key_name}"
@@ -0,0 +1,58 @@
+import asyncio
+import functools
+import logging
+import multiprocessing as mp
+from collections.abc import Callable
+from concurrent.futures import Executor as FuturesExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import ParamSpec, TypeVar
+
+from base.settings import Executor, ExecutorKind
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+@dataclass(slots=True, frozen=True)
+class BoundedExecutor:
+    name: str
+    max_concurrency: int
+    _executor: FuturesExecutor
+    _semaphore: asyncio.Semaphore
+
+    async def run(self, fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def executor_from_settings(name: str, conf: Executor) -> BoundedExecutor:
+    if conf.kind == ExecutorKind.PROCESS:
+        # spawn: forking a process with initialized torch/OpenMP thread pools may deadlock
+        executor: FuturesExecutor = ProcessPoolExecutor(
+            max_workers=conf.max_workers, mp_context=mp.get_context("spawn")
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=conf.max_workers, thread_name_prefix=name)
+
+    logger.info(
+        "executor.created",
+        extra={
+            "executor": name,
+            "kind": conf.kind,
+            "max_workers": conf.max_workers,
+            "max_concurrency": conf.max_concurrency,
+        },
+    )
+    return BoundedExecutor(
+        name=name,
+        max_concurrency=conf.max_concurrency,
+        _executor=executor,
+        _semaphore=asyncio.Semaphore(conf.max_concurrency),
+    )
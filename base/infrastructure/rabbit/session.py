@@ -1,4 +1,5 @@
 from faststream.rabbit import RabbitBroker
+from faststream.security import SASLPlaintext
 
 from base.settings import settings
 
@@ -7,4 +8,6 @@ def broker_from_settings() -> RabbitBroker:
     return RabbitBroker(
         host=settings.rabbit.host,
         port=settings.rabbit.port,
+        virtualhost=settings.rabbit.virtualhost,
+        security=SASLPlaintext(username=settings.rabbit.user, password=settings.rabbit.password),
     )
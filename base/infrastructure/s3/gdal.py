@@ -0,0 +1,30 @@
+from urllib.parse import urlparse
+
+from base.settings import settings
+
+
+def gdal_s3_options_from_settings() -> dict[str, str]:
+    """Конфигурация GDAL для чтения объектов Object Storage через /vsis3/ диапазонными запросами"""
+    endpoint = urlparse(settings.s3_config.endpoint_url)
+    return {
+        "AWS_ACCESS_KEY_ID": settings.s3_config.aws_access_key_id,
+        "AWS_SECRET_ACCESS_KEY": settings.s3_config.aws_secret_access_key,
+        "AWS_REGION": settings.s3_config.region_name,
+        "AWS_S3_ENDPOINT": endpoint.netloc,
+        "AWS_HTTPS": "YES" if endpoint.scheme == "https" else "NO",
+        "AWS_VIRTUAL_HOSTING": "FALSE",
+        # Без листинга каталога при открытии: один HEAD и диапазонные GET вместо LIST на весь префикс
+        "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+        "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif",
+        "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+        "GDAL_HTTP_MULTIPLEX": "YES",
+        "GDAL_HTTP_MAX_RETRY": str(settings.streaming_input.http_max_retry),
+        "GDAL_HTTP_RETRY_DELAY": "0.5",
+        "CPL_VSIL_CURL_CHUNK_SIZE": str(settings.streaming_input.chunk_size_bytes),
+        "VSI_CACHE": "TRUE",
+        "VSI_CACHE_SIZE": str(settings.streaming_input.vsi_cache_bytes),
+    }
+
+
+def vsis3_path(key: str) -> str:
+    return f"/vsis3/{settings.s3_config.bucket_name}/{key}"
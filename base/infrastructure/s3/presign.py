@@ -0,0 +1,65 @@
+import hashlib
+import hmac
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlsplit
+
+from base.settings import S3Config, settings
+from base.utils.datetime_utils import utcnow
+
+_ALGORITHM = "AWS4-HMAC-SHA256"
+
+
+class S3Presigner:
+    def __init__(self, conf: S3Config):
+        """
+        Подпись ссылок на объекты S3 (SigV4, query string) без запросов в сеть
+
+        Ключ подписи зависит только от секрета, даты и региона, поэтому выводится
+        один раз в сутки, а каждая ссылка стоит одного HMAC. Подписывается только
+        заголовок host, тело не подписывается (UNSIGNED-PAYLOAD), как у
+        generate_presigned_url в boto3. Адресация path-style: endpoint/bucket/key.
+        """
+        endpoint = urlsplit(conf.endpoint_url)
+        self._scheme = endpoint.scheme
+        self._host = endpoint.netloc
+        self._bucket = conf.bucket_name
+        self._region = conf.region_name
+        self._access_key_id = conf.aws_access_key_id
+        self._secret_access_key = conf.aws_secret_access_key
+        self._signing_key: tuple[str, bytes] | None = None
+
+    @classmethod
+    def from_settings(cls) -> "S3Presigner":
+        return cls(settings.s3_config)
+
+    def presign(self, method: str, key: str, expires: timedelta, now: datetime | None = None) -> str:
+        now = now or utcnow()
+        date = now.strftime("%Y%m%d")
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{date}/{self._region}/s3/aws4_request"
+
+        path = quote(f"/{self._bucket}/{key}", safe="/-_.~")
+        query = "&".join(
+            f"{name}={quote(value, safe='-_.~')}"
+            for name, value in sorted(
+                {
+                    "X-Amz-Algorithm": _ALGORITHM,
+                    "X-Amz-Credential": f"{self._access_key_id}/{scope}",
+                    "X-Amz-Date": amz_date,
+                    "X-Amz-Expires": str(int(expires.total_seconds())),
+                    "X-Amz-SignedHeaders": "host",
+                }.items()
+            )
+        )
+        canonical_request = f"{method}\n{path}\n{query}\nhost:{self._host}\n\nhost\nUNSIGNED-PAYLOAD"
+        string_to_sign = f"{_ALGORITHM}\n{amz_date}\n{scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+        signature = hmac.new(self._key_for(date), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return f"{self._scheme}://{self._host}{path}?{query}&X-Amz-Signature={signature}"
+
+    def _key_for(self, date: str) -> bytes:
+        if self._signing_key is None or self._signing_key[0] != date:
+            key = f"AWS4{self._secret_access_key}".encode()
+            for part in (date, self._region, "s3", "aws4_request"):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            self._signing_key = (date, key)
+        return self._signing_key[1]
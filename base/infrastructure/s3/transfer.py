@@ -0,0 +1,208 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import botocore.exceptions
+from aioboto3 import Session
+from botocore.config import Config
+
+from base.infrastructure.s3.session import s3_session_from_settings
+from base.settings import S3Config, settings
+
+logger = logging.getLogger(__name__)
+
+
+class S3Transfer:
+    def __init__(self, client: Any, exit_stack: contextlib.AsyncExitStack, conf: S3Config):  # noqa: ANN401
+        """
+        Долгоживущий клиент S3 с общим пулом соединений
+
+        Объекты больше multipart_threshold_bytes загружаются многочастной загрузкой,
+        скачиваются параллельными диапазонными запросами по part_size_bytes,
+        одновременно не больше max_concurrency запросов на одну передачу.
+        Создаётся контейнером и закрывается им же.
+        """
+        self._client = client
+        self._exit_stack = exit_stack
+        self._bucket = conf.bucket_name
+        self._multipart_threshold = conf.multipart_threshold_bytes
+        self._part_size = conf.part_size_bytes
+        self._max_concurrency = conf.max_concurrency
+
+    @classmethod
+    async def from_settings(cls, session: Session | None = None) -> "S3Transfer":
+        conf = settings.s3_config
+        session = session or s3_session_from_settings()
+        exit_stack = contextlib.AsyncExitStack()
+        client = await exit_stack.enter_async_context(
+            session.client(
+                "s3",
+                endpoint_url=conf.endpoint_url,
+                config=Config(
+                    max_pool_connections=conf.max_pool_connections,
+                    connect_timeout=conf.connect_timeout.total_seconds(),
+                    read_timeout=conf.read_timeout.total_seconds(),
+                    tcp_keepalive=True,
+                    retries={"max_attempts": conf.max_attempts, "mode": "adaptive"},
+                ),
+            )
+        )
+        logger.info(
+            "s3.transfer.created",
+            extra={"endpoint": conf.endpoint_url, "max_pool_connections": conf.max_pool_connections},
+        )
+        return cls(client=client, exit_stack=exit_stack, conf=conf)
+
+    @property
+    def client(self) -> Any:  # noqa: ANN401
+        """Клиент aiobotocore для операций, которых нет в S3Transfer"""
+        return self._client
+
+    @property
+    def bucket(self) -> str:
+        return self._bucket
+
+    async def get(self, key: str, if_match: str | None = None) -> bytes:
+        """
+        Первая часть запрашивается сразу, остальные - параллельно, если объект больше части
+
+        if_match (ETag) закрепляет версию объекта, перезаписанный объект даёт PreconditionFailed.
+        """
+        conditions = {} if if_match is None else {"IfMatch": if_match}
+        try:
+            first = await self._client.get_object(Bucket=self._bucket, Key=key, Range=self._range(0), **conditions)
+        except botocore.exceptions.ClientError as e:
+            # Диапазон пустого объекта невыполним
+            if e.response["Error"]["Code"] == "InvalidRange":
+                return b""
+            raise
+        async with first["Body"] as stream:
+            head = await stream.read()
+
+        size = int(first["ContentRange"].rsplit("/", 1)[1]) if "ContentRange" in first else len(head)
+        if size <= len(head):
+            return head
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def get_part(start: int) -> bytes:
+            async with semaphore:
+                response = await self._client.get_object(
+                    Bucket=self._bucket, Key=key, Range=self._range(start), IfMatch=first["ETag"]
+                )
+                async with response["Body"] as part_stream:
+                    return await part_stream.read()
+
+        parts = await asyncio.gather(*(get_part(start) for start in range(len(head), size, self._part_size)))
+        return b"".join((head, *parts))
+
+    async def get_many(self, *keys: str) -> list[bytes]:
+        return list(await asyncio.gather(*(self.get(key) for key in keys)))
+
+    async def put(self, key: str, body: bytes) -> None:
+        if len(body) <= self._multipart_threshold:
+            await self._client.put_object(Bucket=self._bucket, Key=key, Body=body)
+            return
+
+        upload = await self._client.create_multipart_upload(Bucket=self._bucket, Key=key)
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def put_part(number: int, start: int) -> dict[str, Any]:
+            async with semaphore:
+                response = await self._client.upload_part(
+                    Bucket=self._bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=body[start : start + self._part_size],
+                )
+                return {"PartNumber": number, "ETag": response["ETag"]}
+
+        try:
+            parts = await asyncio.gather(
+                *(put_part(number, start) for number, start in enumerate(range(0, len(body), self._part_size), start=1))
+            )
+            await self._client.complete_multipart_upload(
+                Bucket=self._bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await self._client.abort_multipart_upload(Bucket=self._bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def put_stream(
+        self,
+        key: str,
+        read: Callable[[int], Awaitable[bytes]],
+        max_parts_in_flight: int | None = None,
+    ) -> int:
+        """
+        Загрузка из потока частями по part_size_bytes, возвращает размер объекта
+
+        Следующая часть читается, только когда освободилось место, поэтому в памяти
+        не больше max_parts_in_flight частей (по умолчанию max_concurrency).
+        Поток короче одной части загружается одним запросом.
+        """
+        first = await read(self._part_size)
+        if len(first) < self._part_size:
+            await self._client.put_object(Bucket=self._bucket, Key=key, Body=first)
+            return len(first)
+
+        upload = await self._client.create_multipart_upload(Bucket=self._bucket, Key=key)
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(max_parts_in_flight or self._max_concurrency)
+
+        async def put_part(number: int, body: bytes) -> dict[str, Any]:
+            try:
+                response = await self._client.upload_part(
+                    Bucket=self._bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+                )
+            finally:
+                semaphore.release()
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        uploads: list[asyncio.Task[dict[str, Any]]] = []
+        size, body = 0, first
+        try:
+            await semaphore.acquire()
+            while body:
+                size += len(body)
+                uploads.append(asyncio.ensure_future(put_part(len(uploads) + 1, body)))
+                # Место под следующую часть занимается до её чтения
+                await semaphore.acquire()
+                if any(part.done() and part.exception() is not None for part in uploads):
+                    break
+                body = await read(self._part_size)
+            semaphore.release()
+            parts = await asyncio.gather(*uploads)
+            await self._client.complete_multipart_upload(
+                Bucket=self._bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            for part in uploads:
+                part.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+            with contextlib.suppress(Exception):
+                await self._client.abort_multipart_upload(Bucket=self._bucket, Key=key, UploadId=upload_id)
+            raise
+        return size
+
+    async def put_many(self, items: dict[str, bytes]) -> None:
+        await asyncio.gather(*(self.put(key, body) for key, body in items.items()))
+
+    async def head(self, key: str) -> dict[str, Any]:
+        return await self._client.head_object(Bucket=self._bucket, Key=key)
+
+    async def copy(self, source_key: str, key: str) -> None:
+        await self._client.copy_object(
+            Bucket=self._bucket, Key=key, CopySource={"Bucket": self._bucket, "Key": source_key}
+        )
+
+    async def close(self) -> None:
+        await self._exit_stack.aclose()
+
+    def _range(self, start: int) -> str:
+        return f"bytes={start}-{start + self._part_size - 1}"
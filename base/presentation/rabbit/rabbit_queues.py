@@ -1,7 +1,43 @@
-from faststream.rabbit import RabbitQueue
+import uuid
+
+from faststream.rabbit import ExchangeType, RabbitExchange, RabbitQueue
+
+from base.settings import TaskSize, settings
+
+_priority_arguments = (
+    {"x-max-priority": settings.task_routing.max_priority} if settings.task_routing.max_priority else None
+)
 
 process_image_queue = RabbitQueue(
     name="decloud_process_image",
     durable=True,
     auto_delete=False,
+    arguments=_priority_arguments,
+)
+
+process_large_image_queue = RabbitQueue(
+    name="decloud_process_image_large",
+    durable=True,
+    auto_delete=False,
+    arguments=_priority_arguments,
 )
+
+process_image_queues = {
+    TaskSize.SMALL: process_image_queue,
+    TaskSize.LARGE: process_large_image_queue,
+}
+
+# Смены статусов задач от воркеров, каждый процесс API читает их своей временной очередью
+task_status_exchange = RabbitExchange(
+    name="decloud_task_status",
+    type=ExchangeType.FANOUT,
+    durable=True,
+)
+
+
+def task_status_events_queue() -> RabbitQueue:
+    return RabbitQueue(
+        name=f"decloud_task_status.{uuid.uuid4().hex}",
+        exclusive=True,
+        auto_delete=True,
+    )
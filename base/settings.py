@@ -1,3 +1,4 @@
+import enum
 import multiprocessing as mp
 from datetime import timedelta
 from os import getenv
@@ -21,6 +22,7 @@ class Rabbit(PureBaseModel):
     port: int = 5672
     user: str = "guest"
     password: str = "guest"  # noqa: S105
+    virtualhost: str = "/"
 
 
 class FastAPI(PureBaseModel):
@@ -30,19 +32,212 @@ class FastAPI(PureBaseModel):
 
 class S3Config(PureBaseModel):
     endpoint_url: str = "https://storage.yandexcloud.net"
-    generate_presigned_url_endpoint: str = "https://functions.yandexcloud.net/d4eca2ru45nceehl1hva"
     region_name: str = "ru-central1"
     aws_access_key_id: str = "key"
     aws_secret_access_key: str = "key"  # noqa: S105
     bucket_name: str = "testka"
+    # One long-lived client per process, the connection pool is shared by all transfers
+    max_pool_connections: int = 32
+    connect_timeout: timedelta = timedelta(seconds=5)
+    read_timeout: timedelta = timedelta(seconds=60)
+    max_attempts: int = 3
+    # Objects above the threshold are uploaded multipart and downloaded as parallel part_size_bytes ranges
+    multipart_threshold_bytes: int = 16 * 1024 * 1024
+    part_size_bytes: int = 8 * 1024 * 1024
+    max_concurrency: int = 8
 
 
-class HTTPClient(PureBaseModel):
-    timeout: timedelta = timedelta(seconds=5)
+class Presign(PureBaseModel):
+    # Presigned URLs are signed in-process with the s3_config credentials
+    expires: timedelta = timedelta(hours=1)
+    # Keep a presigned_url row per issued upload, nothing reads it back
+    store_urls: bool = True
+    # READY tasks get a presigned GET to the result object
+    result_urls: bool = True
+
+
+class ModelPrecision(str, enum.Enum):
+    FP32 = "fp32"
+    # FP32 weights under CPU/CUDA autocast, best on AVX512-BF16/AMX hosts
+    BF16 = "bf16"
+    # Static INT8 CPU model built by `make quantize-model`, stored as <weights stem>.int8-<weights sha256 prefix>.pt
+    INT8 = "int8"
 
 
 class MLModel(PureBaseModel):
     ml_model_path: str = "resources/gen_Ver0.pth"
+    # BatchNorm folding + frozen TorchScript, cached next to ml_model_path.
+    # The TorchScript artifact is read fully by torch.jit.load, only the eager path mmaps the weights
+    optimize: bool = True
+    precision: ModelPrecision = ModelPrecision.FP32
+    # NHWC activations, tiles are produced in the same layout
+    channels_last: bool = False
+
+    # Tiled inference, tile_size must be a multiple of 16 (GeneratorUNet downsamples 4 times)
+    tile_size: int = 512
+    tile_overlap: int = 64
+    tile_batch_size: int = 1
+
+    # Cross-task micro-batching of tiles in the worker
+    max_batch_size: int = 8
+    max_batch_wait: timedelta = timedelta(milliseconds=20)
+
+    # torch intra-op threads per forward pass, None keeps the torch default
+    num_threads: int | None = None
+
+    # Model registry: version name -> weights file, empty means a single version backed by ml_model_path
+    versions: dict[str, str] = {}
+    active_version: str = "v0"
+    # JSON {"active": "<version>", "versions": {"<version>": "<weights path>"}} polled for hot swap, None disables it
+    registry_manifest_path: str | None = None
+    registry_poll_interval: timedelta = timedelta(seconds=10)
+
+
+class RasterCompression(str, enum.Enum):
+    NONE = "none"
+    DEFLATE = "deflate"
+    ZSTD = "zstd"
+    LZW = "lzw"
+
+
+class OutputProfile(PureBaseModel):
+    # Cloud-Optimized GeoTIFF: overviews before the data, viewers fetch only the windows they need
+    cog: bool = True
+    # Scenes smaller than a block on either side are written as untiled stripped GTiff, not COG
+    block_size: int = 512
+    compression: RasterCompression = RasterCompression.DEFLATE
+    # 1 - none, 2 - horizontal differencing (integers), 3 - floating point
+    predictor: int = 2
+    # DEFLATE 1-9, ZSTD 1-22, None keeps the GDAL default (6 and 9); higher levels gain little on 16-bit data
+    compression_level: int | None = 1
+    # Overview decimation factors, e.g. [2, 4, 8], empty writes no overviews
+    overview_levels: list[int] = []
+    overview_resampling: str = "average"
+
+
+class SceneBufferPool(PureBaseModel):
+    # Freed 15-channel float32 input buffers reused by the next scenes of the same size.
+    # Disabled with a process codec executor: scenes arrive as copies the child processes never reuse
+    max_pooled_bytes: int = 2 * 1024**3
+    # Larger buffers (15 x 4096 x 4096 is 1 GiB) are freed right away instead of being pooled
+    max_buffer_bytes: int = 1024**3
+
+
+class ExecutorKind(str, enum.Enum):
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class Executor(PureBaseModel):
+    # Threads suit GIL-releasing torch/GDAL/numpy calls, processes pickle arguments and results on every call
+    kind: ExecutorKind = ExecutorKind.THREAD
+    max_workers: int = mp.cpu_count()
+    max_concurrency: int = mp.cpu_count()
+
+
+class WorkerPipeline(PureBaseModel):
+    # Concurrent tasks per stage: download+decode, inference (tiles of all tasks share batches), encode+upload
+    prepare_workers: int = 2
+    predict_workers: int = 2
+    finish_workers: int = 2
+    # Tasks waiting in front of each stage; RabbitMQ prefetch is set to the total pipeline depth
+    queue_size: int = 1
+
+
+class TaskSize(str, enum.Enum):
+    SMALL = "small"
+    LARGE = "large"
+
+
+class TaskRouting(PureBaseModel):
+    # Tasks above either threshold go to the large queue; pixels are read from the optical GeoTIFF header,
+    # bytes (both inputs) are used when the header can't be parsed
+    large_task_pixels: int = 4096 * 4096
+    large_task_bytes: int = 512 * 1024**2
+    # x-max-priority of both queues, smaller scenes get higher priority; 0 disables priorities.
+    # RabbitMQ can't change the argument of an existing queue, it has to be deleted first
+    max_priority: int = 0
+
+
+class WorkerConsumer(PureBaseModel):
+    # Queues this worker consumes, e.g. ["small"] or ["large"] for dedicated pools
+    task_sizes: list[TaskSize] = [TaskSize.SMALL, TaskSize.LARGE]
+    # Tasks handled concurrently by one worker, None uses the worker pipeline depth
+    max_in_flight: int | None = None
+    # Messages delivered ahead of acks across all task_sizes queues (one channel, global QoS),
+    # None matches max_in_flight; a higher value hides broker round trips
+    prefetch_count: int | None = None
+    # Ack after the result is uploaded and the task is READY, tasks of a crashed worker are redelivered.
+    # False acks when the task is taken into work (at most once); prefetch still applies in both modes
+    ack_after_upload: bool = True
+
+
+class TaskStatusWriter(PureBaseModel):
+    # Status changes of concurrent tasks are written as one UPDATE per flush
+    flush_interval: timedelta = timedelta(milliseconds=20)
+    max_batch_size: int = 100
+    # A failed UPDATE is retried with doubling delays, status changes queued meanwhile join the batch
+    max_attempts: int = 5
+    retry_delay: timedelta = timedelta(milliseconds=100)
+    max_retry_delay: timedelta = timedelta(seconds=2)
+    # Flush count, batch size and flush latency are logged at most once per interval while the worker runs
+    stats_interval: timedelta = timedelta(minutes=1)
+    # Publish flushed status changes to the fanout exchange read by the API status caches
+    publish_events: bool = True
+
+
+class TaskStatusCache(PureBaseModel):
+    # In-process cache of GET /v1/image/{task_id}, updated by worker status events
+    enabled: bool = True
+    # Non-terminal and unknown tasks; bounds staleness when an event is lost
+    ttl: timedelta = timedelta(seconds=2)
+    ready_ttl: timedelta = timedelta(hours=1)
+    max_entries: int = 100_000
+
+
+class ImageUpload(PureBaseModel):
+    # Upload parts buffered per request across both files, parts are part_size_bytes each
+    memory_budget_bytes: int = 64 * 1024 * 1024
+    # Leading bytes of the optical file read for routing, the first IFD of a GeoTIFF is usually here
+    header_bytes: int = 1024 * 1024
+    # A confirm republishes a QUEUED task only if its publish failed or was claimed longer ago than this
+    publish_lease: timedelta = timedelta(seconds=30)
+
+
+class TaskEvents(PureBaseModel):
+    # Worker: min interval between inference progress events of one task
+    progress_interval: timedelta = timedelta(seconds=1)
+    # API: SSE keep-alive comment interval, events buffered per client, task_ids per stream
+    heartbeat_interval: timedelta = timedelta(seconds=15)
+    client_queue_size: int = 64
+    max_task_ids: int = 100
+
+
+class StreamingInput(PureBaseModel):
+    # Read input windows from S3 via GDAL /vsis3/ tile by tile instead of downloading whole files.
+    # NaN in float inputs are filled with the mean of the read window, not of the whole scene.
+    # Thread codec executor only: tiles are read from open datasets that can't be sent to another process
+    enabled: bool = False
+    chunk_size_bytes: int = 1024 * 1024
+    # Per-file GDAL block cache for range reads shared by overlapping tiles
+    vsi_cache_bytes: int = 64 * 1024 * 1024
+    http_max_retry: int = 3
+
+
+class ResultCache(PureBaseModel):
+    # Results keyed by sha256 of both inputs and the model version, stored next to uploads in S3
+    enabled: bool = True
+    prefix: str = "result-cache/"
+    max_age: timedelta = timedelta(days=7)
+    max_size_bytes: int = 50 * 1024**3
+    sweep_interval: timedelta = timedelta(hours=1)
+
+
+class InputCache(PureBaseModel):
+    # Local disk LRU of downloaded inputs keyed by object key and ETag, decoded from the file, not from memory
+    enabled: bool = False
+    directory: str = "/tmp/decloud-input-cache"  # noqa: S108
+    max_size_bytes: int = 20 * 1024**3
 
 
 class Postgres(PureBaseModel):
@@ -86,8 +281,22 @@ class Settings(BaseSettings):
     pg_rw: Postgres = Postgres()
     pg_ro: Postgres = Postgres()
     logger: LoggerSettings = LoggerSettings()
-    http_client: HTTPClient = HTTPClient()
     ml_model: MLModel = MLModel()
+    codec_executor: Executor = Executor()
+    scene_buffer_pool: SceneBufferPool = SceneBufferPool()
+    inference_executor: Executor = Executor(max_workers=1, max_concurrency=1)
+    worker_pipeline: WorkerPipeline = WorkerPipeline()
+    worker_consumer: WorkerConsumer = WorkerConsumer()
+    task_routing: TaskRouting = TaskRouting()
+    image_upload: ImageUpload = ImageUpload()
+    presign: Presign = Presign()
+    task_status_writer: TaskStatusWriter = TaskStatusWriter()
+    task_status_cache: TaskStatusCache = TaskStatusCache()
+    task_events: TaskEvents = TaskEvents()
+    result_cache: ResultCache = ResultCache()
+    input_cache: InputCache = InputCache()
+    streaming_input: StreamingInput = StreamingInput()
+    output_profile: OutputProfile = OutputProfile()
 
     model_config = SettingsConfigDict(
         env_file=env_file_path, env_prefix="cloud_", env_nested_delimiter="__", case_sensitive=False, extra="ignore"
@@ -0,0 +1,47 @@
+import struct
+
+_IMAGE_WIDTH = 256
+_IMAGE_LENGTH = 257
+# SHORT, LONG, LONG8
+_INTEGER_FORMATS = {3: "H", 4: "I", 16: "Q"}
+
+
+def tiff_dimensions(header: bytes) -> tuple[int, int] | None:
+    """Width and height from the first IFD of a classic or BigTIFF, None if they are not in header"""
+    if len(header) < 8 or header[:2] not in (b"II", b"MM"):
+        return None
+    order = "<" if header[:2] == b"II" else ">"
+    try:
+        layout = _ifd_layout(header, order)
+        if layout is None:
+            return None
+        ifd_offset, count_format, entry_format, value_size = layout
+
+        (entries,) = struct.unpack_from(f"{order}{count_format}", header, ifd_offset)
+        entry_size = struct.calcsize(f"{order}{entry_format}") + value_size
+        offset = ifd_offset + struct.calcsize(f"{order}{count_format}")
+        dimensions: dict[int, int] = {}
+        for _ in range(entries):
+            tag, field_type, _count = struct.unpack_from(f"{order}{entry_format}", header, offset)
+            if tag in (_IMAGE_WIDTH, _IMAGE_LENGTH) and field_type in _INTEGER_FORMATS:
+                value_offset = offset + entry_size - value_size
+                (dimensions[tag],) = struct.unpack_from(f"{order}{_INTEGER_FORMATS[field_type]}", header, value_offset)
+            offset += entry_size
+    except struct.error:
+        return None
+
+    if _IMAGE_WIDTH not in dimensions or _IMAGE_LENGTH not in dimensions:
+        return None
+    return dimensions[_IMAGE_WIDTH], dimensions[_IMAGE_LENGTH]
+
+
+def _ifd_layout(header: bytes, order: str) -> tuple[int, str, str, int] | None:
+    """Offset of the first IFD, formats of its entry count and entry prefix, size of the entry value"""
+    (version,) = struct.unpack_from(f"{order}H", header, 2)
+    if version == 42:
+        (ifd_offset,) = struct.unpack_from(f"{order}I", header, 4)
+        return ifd_offset, "H", "HHI", 4
+    if version == 43:
+        (ifd_offset,) = struct.unpack_from(f"{order}Q", header, 8)
+        return ifd_offset, "Q", "HHQ", 8
+    return None
@@ -1,34 +1,22 @@
-import boto3
-import requests
+import json
+import os
 
+import requests
 
-def handler(event, context):
-    bucket_name = event['bucket']['name']
-    object_key = event['object']['key']
-    task_id = object_key.split('/')[-1]
+BACKEND_API_URL = os.getenv("BACKEND_API_URL")
 
-    processed_key = f"processed/{task_id}"
 
-    s3 = boto3.client(
-        's3',
-        endpoint_url='https://storage.yandexcloud.net',
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-    )
-    s3.copy_object(
-        Bucket=bucket_name,
-        CopySource={'Bucket': bucket_name, 'Key': object_key},
-        Key=processed_key,
-    )
-    # Обновляем статус в Django через API
-    update_status_url = f"{os.getenv('BACKEND_API_URL')}/api/update-status/{task_id}/"
-    response = requests.post(
-        update_status_url,
-        headers={"Authorization": "Bearer API_TOKEN"},
-        json={"status": "ready"}
-    )
+def handler(event, _):  # noqa: ANN201, ANN001
+    # Триггер Object Storage на создание объекта: {bucket}/uploads/{task_id}/{optical,sar}.tif
+    results = {}
+    for message in event.get("messages", []):
+        object_key = message["details"]["object_id"]
+        parts = object_key.split("/")
+        if len(parts) < 3 or parts[-3] != "uploads":
+            continue
+        task_id = parts[-2]
+        # Задача создаётся и ставится в очередь после второго снимка, пока его нет - ответ 400
+        response = requests.post(f"{BACKEND_API_URL}/v1/image/{task_id}/confirm", timeout=10)
+        results[task_id] = response.status_code
 
-    return {
-        'statusCode': 200,
-        'body': 'Файл обработан и статус обновлен'
-    }
\ No newline at end of file
+    return {"statusCode": 200, "body": json.dumps(results)}
@@ -1,34 +1,148 @@
+import asyncio
 from dataclasses import dataclass
+from pathlib import Path
+
+import torch
 
 from base.containers.base import Container
+from base.infrastructure.executor.pool import BoundedExecutor, executor_from_settings
 from base.infrastructure.pg.client import engine_from_settings_both
-from base.infrastructure.s3.session import s3_session_from_settings
+from base.infrastructure.s3.gdal import gdal_s3_options_from_settings
+from base.infrastructure.s3.transfer import S3Transfer
+from base.settings import ExecutorKind, settings
+from base.utils.timing import timed
 from neuro_api_context.repositories.db_repository import DBRepository
+from neuro_api_context.repositories.input_cache import InputCache
 from neuro_api_context.repositories.s3_repository import S3Repository
 from neuro_api_context.services.image_processing_service import ImageProcessor
+from neuro_api_context.services.inference_batcher import InferenceBatcher
 from neuro_api_context.services.ml_evaluator import MLModelService
+from neuro_api_context.services.model_registry import ModelRegistry
 from neuro_api_context.services.neuro_api_service import NeuroApiService
+from neuro_api_context.services.result_cache import ResultCache
+from neuro_api_context.services.task_events import TaskEventPublisher
+from neuro_api_context.services.task_pipeline import TaskPipeline
+from neuro_api_context.services.task_status_writer import TaskStatusWriter
 
 
 @dataclass(frozen=True, slots=True)
 class NeuroApiContainer(Container):
     neuro_api_service: NeuroApiService
+    task_pipeline: TaskPipeline
+    status_writer: TaskStatusWriter
+    task_events: TaskEventPublisher
+    inference_batcher: InferenceBatcher
+    model_registry: ModelRegistry
+    codec_executor: BoundedExecutor
+    inference_executor: BoundedExecutor
+    s3_transfer: S3Transfer
+    result_cache: ResultCache | None = None
 
     @classmethod
-    async def build_from_settings(cls) -> "NeuroApiContainer":
-        _s3_session = s3_session_from_settings()
+    async def build_from_settings(cls, timings: dict[str, float] | None = None) -> "NeuroApiContainer":
+        timings = {} if timings is None else timings
+        if settings.inference_executor.kind == ExecutorKind.PROCESS:
+            raise ValueError("Inference executor supports only threads, the model is not shared between processes")
+        if settings.streaming_input.enabled and settings.codec_executor.kind == ExecutorKind.PROCESS:
+            raise ValueError(
+                "Streaming input requires a thread codec executor, open datasets are not shared between processes"
+            )
+        if settings.ml_model.num_threads is not None:
+            torch.set_num_threads(settings.ml_model.num_threads)
+
+        s3_transfer = await S3Transfer.from_settings()
+
+        input_cache = None
+        if settings.input_cache.enabled:
+            input_cache = await asyncio.to_thread(
+                InputCache, Path(settings.input_cache.directory), settings.input_cache.max_size_bytes
+            )
 
-        _s3_repository = S3Repository(_s3_session=_s3_session)
+        _s3_repository = S3Repository(_s3_transfer=s3_transfer, _input_cache=input_cache)
 
         pg_rw_client, pg_ro_client = engine_from_settings_both()
         db_repository = DBRepository(_engine_ro=pg_ro_client, _engine_rw=pg_rw_client)
-        image_processor = ImageProcessor()
-        ml_model_service = MLModelService(_model=MLModelService.load_model())
+        status_writer = TaskStatusWriter(
+            db_repository,
+            max_batch_size=settings.task_status_writer.max_batch_size,
+            flush_interval=settings.task_status_writer.flush_interval,
+            max_attempts=settings.task_status_writer.max_attempts,
+            retry_delay=settings.task_status_writer.retry_delay,
+            max_retry_delay=settings.task_status_writer.max_retry_delay,
+            stats_interval=settings.task_status_writer.stats_interval,
+        )
+        task_events = TaskEventPublisher(progress_interval=settings.task_events.progress_interval)
+        status_writer.add_listener(task_events.statuses_flushed)
+        # Сцены из пула процессов приходят копиями, которые prepare в дочернем процессе не переиспользует
+        max_pooled_bytes = settings.scene_buffer_pool.max_pooled_bytes
+        if settings.codec_executor.kind == ExecutorKind.PROCESS:
+            max_pooled_bytes = 0
+        image_processor = ImageProcessor(
+            channels_last=settings.ml_model.channels_last,
+            max_pooled_bytes=max_pooled_bytes,
+            max_pooled_buffer_bytes=settings.scene_buffer_pool.max_buffer_bytes,
+            output_profile=settings.output_profile,
+        )
+        device = MLModelService.default_device()
+        model_registry = ModelRegistry.from_settings(device)
+        with timed(timings, "model_load_ms"):
+            await model_registry.start()
+        codec_executor = executor_from_settings("codec", settings.codec_executor)
+        inference_executor = executor_from_settings("inference", settings.inference_executor)
+        inference_batcher = InferenceBatcher(
+            executor=inference_executor,
+            max_batch_size=settings.ml_model.max_batch_size,
+            max_wait=settings.ml_model.max_batch_wait,
+        )
+        result_cache = None
+        if settings.result_cache.enabled:
+            result_cache = ResultCache(
+                _s3_repository,
+                max_age=settings.result_cache.max_age,
+                max_size_bytes=settings.result_cache.max_size_bytes,
+                sweep_interval=settings.result_cache.sweep_interval,
+            )
+            result_cache.start()
         neuro_api_service = NeuroApiService(
             _s3_repository=_s3_repository,
-            _db_repository=db_repository,
+            _status_writer=status_writer,
             _image_processor=image_processor,
-            _ml_model_service=ml_model_service,
+            _inference_batcher=inference_batcher,
+            _model_registry=model_registry,
+            _codec_executor=codec_executor,
+            _result_cache=result_cache,
+            _gdal_options=gdal_s3_options_from_settings() if settings.streaming_input.enabled else None,
+            _task_events=task_events,
+        )
+        task_pipeline = TaskPipeline.for_service(
+            neuro_api_service,
+            prepare_workers=settings.worker_pipeline.prepare_workers,
+            predict_workers=settings.worker_pipeline.predict_workers,
+            finish_workers=settings.worker_pipeline.finish_workers,
+            queue_size=settings.worker_pipeline.queue_size,
+        )
+        task_pipeline.start()
+
+        return cls(
+            neuro_api_service=neuro_api_service,
+            task_pipeline=task_pipeline,
+            status_writer=status_writer,
+            task_events=task_events,
+            inference_batcher=inference_batcher,
+            model_registry=model_registry,
+            codec_executor=codec_executor,
+            inference_executor=inference_executor,
+            s3_transfer=s3_transfer,
+            result_cache=result_cache,
         )
 
-        return cls(neuro_api_service=neuro_api_service)
+    async def close(self) -> None:
+        await self.task_pipeline.close()
+        await self.status_writer.close()
+        await self.model_registry.close()
+        if self.result_cache is not None:
+            await self.result_cache.close()
+        await self.inference_batcher.close()
+        self.codec_executor.shutdown()
+        self.inference_executor.shutdown()
+        await self.s3_transfer.close()
@@ -1,13 +1,45 @@
 import asyncio
+import importlib
+import logging
+from types import ModuleType
 
+from faststream.rabbit import RabbitBroker
+
+from base.infrastructure.rabbit.session import broker_from_settings
 from base.presentation import runner
-from neuro_api_context.containers.neuro_api_container import NeuroApiContainer
-from neuro_api_context.presentation.rabbit.app import create_app
+from base.utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+
+def _import_worker_modules() -> tuple[ModuleType, ModuleType]:
+    # torch/numpy/GDAL bindings are imported here, off the event loop, while the broker connects
+    return (
+        importlib.import_module("neuro_api_context.containers.neuro_api_container"),
+        importlib.import_module("neuro_api_context.presentation.rabbit.app"),
+    )
+
+
+async def _connect_broker(broker: RabbitBroker, timings: dict[str, float]) -> None:
+    with timed(timings, "broker_connect_ms"):
+        await broker.connect()
 
 
 async def main() -> None:
-    neuro_api_container = await NeuroApiContainer.build_from_settings()
-    app = await create_app(neuro_api_container)
+    timings: dict[str, float] = {}
+    with timed(timings, "startup_ms"):
+        broker = broker_from_settings()
+        broker_connect = asyncio.create_task(_connect_broker(broker, timings))
+
+        with timed(timings, "imports_ms"):
+            container_module, app_module = await asyncio.to_thread(_import_worker_modules)
+        with timed(timings, "container_ms"):
+            neuro_api_container = await container_module.NeuroApiContainer.build_from_settings(timings)
+
+        await broker_connect
+        app = await app_module.create_app(neuro_api_container, broker)
+
+    logger.info("worker.startup.timings", extra=timings)
     await runner.run(app.run())
 
 
@@ -0,0 +1,47 @@
+import logging
+import time
+
+import torch
+
+from base.settings import settings
+from neuro_api_context.ml.optimization import optimized_model_path, verify_equivalence
+from neuro_api_context.services.ml_evaluator import MLModelService
+
+logger = logging.getLogger(__name__)
+
+
+def _forward_ms(model: torch.nn.Module, sample: torch.Tensor, repeats: int = 5) -> float:
+    with torch.no_grad():
+        model(sample)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(sample)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main() -> None:
+    settings.ml_model.optimize = True
+    device = MLModelService.default_device()
+    eager = MLModelService.load_eager_model(device)
+    optimized = MLModelService.load_model(device)
+
+    tile_size = settings.ml_model.tile_size
+    max_abs_diff = verify_equivalence(eager, optimized, device, input_shape=(1, 15, tile_size, tile_size))
+    sample = torch.rand(1, 15, tile_size, tile_size, device=device) * 2 - 1
+    # Тот же variant, с которым load_model записал артефакт
+    artifact = optimized_model_path(
+        settings.ml_model.ml_model_path, device, variant=str(MLModelService.memory_format_from_settings())
+    )
+    logger.info(
+        "optimized.model.verified",
+        extra={
+            "path": str(artifact),
+            "max_abs_diff": max_abs_diff,
+            "eager_ms": _forward_ms(eager, sample),
+            "optimized_ms": _forward_ms(optimized, sample),
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import logging
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from base.settings import ModelPrecision, settings
+from neuro_api_context.ml.quantization import (
+    compare_bands,
+    quantize_model,
+    quantized_model_path,
+    save_quantized_model,
+)
+from neuro_api_context.services.image_processing_service import ImageProcessor
+from neuro_api_context.services.ml_evaluator import MLModelService
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Calibrate INT8 GeneratorUNet and compare it with FP32")
+    parser.add_argument("--samples", type=Path, required=True, help="Directory of <name>/optical.tif + sar.tif pairs")
+    parser.add_argument("--weights", default=settings.ml_model.ml_model_path, help="FP32 weights to quantize")
+    parser.add_argument("--report", type=Path, default=Path("quantization_report.json"))
+    parser.add_argument("--max-tiles-per-sample", type=int, default=16)
+    return parser.parse_args()
+
+
+def _sample_dirs(samples: Path) -> list[Path]:
+    dirs = sorted(p for p in samples.iterdir() if (p / "optical.tif").exists() and (p / "sar.tif").exists())
+    if not dirs:
+        raise ValueError(f"No optical.tif/sar.tif pairs found in {samples}")
+    return dirs
+
+
+def _load_scene(processor: ImageProcessor, sample: Path) -> np.ndarray:
+    return processor.prepare((sample / "optical.tif").read_bytes(), (sample / "sar.tif").read_bytes())
+
+
+def _calibration_batches(
+    processor: ImageProcessor,
+    service: MLModelService,
+    samples: list[Path],
+    max_tiles: int,
+) -> Iterator[torch.Tensor]:
+    tiler = service.tiler
+    for sample in samples:
+        scene = _load_scene(processor, sample)
+        windows = tiler.windows(scene.shape[1], scene.shape[2])
+        step = max(len(windows) // max_tiles, 1)
+        for window in windows[::step][:max_tiles]:
+            yield torch.from_numpy(tiler.extract(scene, [window]))
+
+
+def _timed_uint16(processor: ImageProcessor, service: MLModelService, scene: np.ndarray) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    output = service.predict_scene(scene)
+    return processor.to_uint16(output), time.perf_counter() - start
+
+
+def main() -> None:
+    args = _parse_args()
+    device = torch.device("cpu")
+    processor = ImageProcessor()
+    samples = _sample_dirs(args.samples)
+
+    settings.ml_model.precision = ModelPrecision.FP32
+    fp32 = MLModelService.build(args.weights, device)
+
+    quantized_model = quantize_model(
+        MLModelService.load_eager_model(device, args.weights),
+        _calibration_batches(processor, fp32, samples, args.max_tiles_per_sample),
+    )
+    output_path = quantized_model_path(args.weights)
+    save_quantized_model(quantized_model, output_path)
+    int8 = MLModelService(_model=quantized_model, _tiler=fp32.tiler, _device=device)
+
+    report_samples = []
+    fp32_seconds = int8_seconds = 0.0
+    for sample in samples:
+        scene = _load_scene(processor, sample)
+        reference, fp32_elapsed = _timed_uint16(processor, fp32, scene)
+        candidate, int8_elapsed = _timed_uint16(processor, int8, scene)
+        fp32_seconds += fp32_elapsed
+        int8_seconds += int8_elapsed
+        report_samples.append({"sample": sample.name, "bands": compare_bands(reference, candidate)})
+
+    bands = [
+        {
+            "band": band["band"],
+            "rmse": float(np.mean([s["bands"][i]["rmse"] for s in report_samples])),
+            "psnr": float(np.mean([s["bands"][i]["psnr"] for s in report_samples])),
+        }
+        for i, band in enumerate(report_samples[0]["bands"])
+    ]
+    report = {
+        "model": output_path,
+        "fp32_seconds": fp32_seconds,
+        "int8_seconds": int8_seconds,
+        "speedup": fp32_seconds / int8_seconds,
+        "bands": bands,
+        "samples": report_samples,
+    }
+    args.report.write_text(json.dumps(report, indent=2))
+    logger.info(
+        "quantization.report.saved",
+        extra={"path": str(args.report), "speedup": report["speedup"], "min_psnr": min(b["psnr"] for b in bands)},
+    )
+
+
+if __name__ == "__main__":
+    main()
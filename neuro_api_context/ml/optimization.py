@@ -0,0 +1,151 @@
+import contextlib
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import torch
+from torch import nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from neuro_api_context.presentation.ml.model import GeneratorUNet, UNetDown, UNetUp
+
+logger = logging.getLogger(__name__)
+
+# Bump when build_optimized_model changes, so cached artifacts are rebuilt
+OPTIMIZATION_REVISION = 1
+
+
+def fold_batchnorm(model: GeneratorUNet) -> GeneratorUNet:
+    """
+    Копия модели для инференса: BatchNorm свёрнут в предшествующую свёртку
+    (обычную или транспонированную), неактивные в eval Dropout удалены
+    """
+    folded = copy.deepcopy(model).eval()
+    for block in folded.modules():
+        if isinstance(block, (UNetDown, UNetUp)):
+            block.model = _fold_sequential(block.model)
+    folded.final = _fold_sequential(folded.final)
+    return folded
+
+
+def build_optimized_model(model: GeneratorUNet) -> torch.jit.ScriptModule:
+    scripted = torch.jit.script(fold_batchnorm(model))
+    return torch.jit.freeze(scripted.eval())
+
+
+def verify_equivalence(
+    reference: nn.Module,
+    optimized: nn.Module,
+    device: torch.device,
+    input_shape: tuple[int, int, int, int] = (2, 15, 64, 64),
+    atol: float = 1e-4,
+) -> float:
+    """Сравнение выходов на случайном входе, возвращает максимальное абсолютное отклонение"""
+    generator = torch.Generator().manual_seed(0)
+    sample = (torch.rand(input_shape, generator=generator) * 2 - 1).to(device)
+    with torch.no_grad():
+        max_abs_diff = (reference(sample) - optimized(sample)).abs().max().item()
+
+    if max_abs_diff > atol:
+        raise ValueError(f"Optimized model diverges from eager model: max abs diff {max_abs_diff} > {atol}")
+    return max_abs_diff
+
+
+def weights_digest(weights_path: str) -> str:
+    """
+    sha256 содержимого файла весов: одно имя версии с другими весами даёт другой результат
+
+    Хэш хранится в <name>.sha256 рядом с весами вместе с размером и mtime файла
+    и пересчитывается, только когда они изменились, поэтому старт и опрос
+    манифеста не перечитывают веса целиком.
+    """
+    weights = Path(weights_path)
+    stat = weights.stat()
+    sidecar = weights.with_name(f"{weights.name}.sha256")
+    with contextlib.suppress(OSError, ValueError):
+        cached = json.loads(sidecar.read_text())
+        if cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with weights.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    try:
+        save_atomic(json.dumps(entry).encode(), sidecar)
+    except OSError:
+        logger.warning("weights.digest.not.cached", extra={"path": str(sidecar)}, exc_info=True)
+    return entry["sha256"]
+
+
+def optimized_model_path(weights_path: str, device: torch.device, variant: str = "") -> Path:
+    digest = hashlib.sha256(weights_digest(weights_path).encode())
+    digest.update(f"{torch.__version__}:{device.type}:{variant}:{OPTIMIZATION_REVISION}".encode())
+
+    weights = Path(weights_path)
+    return weights.with_name(f"{weights.stem}.optimized-{digest.hexdigest()[:16]}.pt")
+
+
+def load_optimized_model(
+    weights_path: str,
+    device: torch.device,
+    load_eager: Callable[[], GeneratorUNet],
+    variant: str = "",
+) -> torch.jit.ScriptModule:
+    """
+    variant различает артефакты одних весов, собранные из по-разному подготовленной модели
+
+    torch.jit.load не умеет mmap: артефакт читается в память целиком, отображение
+    файла (load_state_dict) работает только для eager модели.
+    """
+    artifact = optimized_model_path(weights_path, device, variant)
+    if artifact.exists():
+        logger.info("optimized.model.loaded", extra={"path": str(artifact)})
+        return torch.jit.load(str(artifact), map_location=device)
+
+    eager = load_eager()
+    optimized = build_optimized_model(eager)
+    max_abs_diff = verify_equivalence(eager, optimized, device)
+    logger.info("optimized.model.built", extra={"path": str(artifact), "max_abs_diff": max_abs_diff})
+
+    try:
+        save_atomic(optimized, artifact)
+    except OSError:
+        logger.warning("optimized.model.not.cached", extra={"path": str(artifact)}, exc_info=True)
+    return optimized
+
+
+def _fold_sequential(sequential: nn.Sequential) -> nn.Sequential:
+    layers: list[nn.Module] = []
+    for layer in sequential:
+        if isinstance(layer, nn.Dropout):
+            continue
+        if isinstance(layer, nn.BatchNorm2d) and layers and isinstance(layers[-1], (nn.Conv2d, nn.ConvTranspose2d)):
+            conv = layers.pop()
+            layers.append(fuse_conv_bn_eval(conv, layer, transpose=isinstance(conv, nn.ConvTranspose2d)))
+            continue
+        layers.append(layer)
+    return nn.Sequential(*layers)
+
+
+def save_atomic(obj: torch.jit.ScriptModule | dict[str, Any] | bytes, path: Path) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        if isinstance(obj, bytes):
+            Path(tmp_path).write_bytes(obj)
+        elif isinstance(obj, torch.jit.ScriptModule):
+            torch.jit.save(obj, tmp_path)
+        else:
+            torch.save(obj, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
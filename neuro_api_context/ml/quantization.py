@@ -0,0 +1,81 @@
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from neuro_api_context.ml.optimization import fold_batchnorm, save_atomic, weights_digest
+from neuro_api_context.presentation.ml.model import GeneratorUNet
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_ENGINE = "x86"
+UINT16_PEAK = 65535.0
+
+
+def quantize_model(model: GeneratorUNet, calibration: Iterable[torch.Tensor]) -> torch.jit.ScriptModule:
+    """
+    Статическая INT8 квантизация (FX graph mode) свёрток и транспонированных свёрток
+
+    Модель предварительно сворачивается с BatchNorm, диапазоны активаций
+    собираются на калибровочных батчах (N, 15, H, W).
+    """
+    # torch.fx тяжёлый, воркеру с готовой INT8 моделью он не нужен
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    batches = iter(calibration)
+    first = next(batches, None)
+    if first is None:
+        raise ValueError("Calibration requires at least one batch")
+
+    prepared = prepare_fx(
+        fold_batchnorm(model),
+        get_default_qconfig_mapping(QUANTIZED_ENGINE),
+        example_inputs=(first,),
+    )
+    calibrated = 0
+    with torch.no_grad():
+        for batch in (first, *batches):
+            prepared(batch)
+            calibrated += len(batch)
+    logger.info("quantization.calibrated", extra={"tiles": calibrated})
+
+    quantized = convert_fx(prepared)
+    return torch.jit.freeze(torch.jit.script(quantized).eval())
+
+
+def quantized_model_path(weights_path: str) -> str:
+    """Артефакт привязан к содержимому весов: новые веса по тому же пути требуют новой квантизации"""
+    weights = Path(weights_path)
+    return str(weights.with_name(f"{weights.stem}.int8-{weights_digest(weights_path)[:16]}.pt"))
+
+
+def save_quantized_model(model: torch.jit.ScriptModule, path: str) -> None:
+    save_atomic(model, Path(path))
+
+
+def load_quantized_model(path: str, device: torch.device) -> torch.jit.ScriptModule:
+    if device.type != "cpu":
+        raise ValueError(f"INT8 model runs only on CPU, got device {device}")
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Quantized model {path} not found, run make quantize-model first")
+
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    logger.info("quantized.model.loaded", extra={"path": path})
+    return torch.jit.load(path, map_location=device)
+
+
+def compare_bands(reference: np.ndarray, candidate: np.ndarray) -> list[dict[str, float]]:
+    """Поканальные RMSE и PSNR двух uint16 снимков (C, H, W)"""
+    if reference.shape != candidate.shape:
+        raise ValueError(f"Shapes differ: {reference.shape} != {candidate.shape}")
+
+    bands = []
+    for band, (ref, cand) in enumerate(zip(reference, candidate, strict=True), start=1):
+        mse = float(np.mean((ref.astype(np.float64) - cand.astype(np.float64)) ** 2))
+        psnr = float("inf") if mse == 0 else 10 * np.log10(UINT16_PEAK**2 / mse)
+        bands.append({"band": band, "rmse": mse**0.5, "psnr": psnr})
+    return bands
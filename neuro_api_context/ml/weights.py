@@ -0,0 +1,37 @@
+import logging
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import torch
+
+from neuro_api_context.ml.optimization import save_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def load_state_dict(weights_path: str, device: torch.device) -> dict[str, Any]:
+    """
+    Загрузка state_dict с отображением файла в память вместо чтения целиком
+
+    Файлы в старом (не zip) формате torch.save один раз конвертируются
+    в <stem>.mmap.pt рядом с исходными весами. На CUDA mmap не даёт выигрыша,
+    тензоры всё равно копируются на устройство. mmap относится только к eager
+    пути: оптимизированный артефакт читается torch.jit.load целиком.
+    """
+    if device.type != "cpu":
+        return torch.load(weights_path, map_location=device, weights_only=True)
+    return torch.load(_mmap_compatible_path(weights_path), map_location=device, mmap=True, weights_only=True)
+
+
+def _mmap_compatible_path(weights_path: str) -> str:
+    if zipfile.is_zipfile(weights_path):
+        return weights_path
+
+    weights = Path(weights_path)
+    converted = weights.with_name(f"{weights.stem}.mmap.pt")
+    if not converted.exists() or converted.stat().st_mtime < weights.stat().st_mtime:
+        state_dict = torch.load(weights_path, map_location="cpu", weights_only=True)
+        save_atomic(state_dict, converted)
+        logger.info("weights.converted.for.mmap", extra={"source": weights_path, "path": str(converted)})
+    return str(converted)
@@ -3,19 +3,20 @@ import logging
 from faststream import FastStream
 from faststream.rabbit import RabbitBroker
 
-from base.presentation.rabbit.rabbit_queues import process_image_queue
-from base.settings import settings
+from base.presentation.rabbit.rabbit_queues import process_image_queues, task_status_exchange
+from base.settings import TaskSize, settings
 
 logger = logging.getLogger(__name__)
 
 
-def create_faststream_app() -> tuple[FastStream, RabbitBroker]:
-    broker = RabbitBroker(host=settings.rabbit.host, port=settings.rabbit.port)
+def create_faststream_app(broker: RabbitBroker) -> FastStream:
     app = FastStream(broker)
 
     @app.on_startup
     async def declare_queues():
         await broker.connect()
-        await broker.declare_queue(process_image_queue)
+        for task_size in settings.worker_consumer.task_sizes:
+            await broker.declare_queue(process_image_queues[TaskSize(task_size)])
+        await broker.declare_exchange(task_status_exchange)
 
-    return app, broker
+    return app
@@ -1,27 +1,91 @@
+import asyncio
+import functools
 import logging
 import uuid
+from collections.abc import Awaitable, Callable
 
 from faststream import FastStream
+from faststream.rabbit import Channel, RabbitBroker
+from faststream.rabbit.annotations import RabbitMessage
 
-from base.presentation.rabbit.rabbit_queues import process_image_queue
+from backend_context.schemas.api_schemas import TaskStatusEvent
+from base.presentation.rabbit.rabbit_queues import process_image_queues, task_status_exchange
+from base.settings import TaskSize, settings
 from neuro_api_context.containers.neuro_api_container import NeuroApiContainer
 from neuro_api_context.presentation.app import create_faststream_app
 
 logger = logging.getLogger(__name__)
 
 
-async def create_app(container: NeuroApiContainer) -> FastStream:
+async def create_app(container: NeuroApiContainer, broker: RabbitBroker) -> FastStream:
     # router = RabbitRouter(prefix="decloud_")
-    app, broker = create_faststream_app()
+    app = create_faststream_app(broker)
 
-    @broker.subscriber(process_image_queue)
-    async def process_images(task_id: uuid.UUID) -> None:
-        try:
-            await container.neuro_api_service.process_task(task_id)
-            logger.info("imaged.processed", extra={"task_id": task_id})
-        except Exception as e:
-            logger.exception("processing.image.error.occurred", extra={"task_id": task_id}, exc_info=e)
-            raise
+    if settings.task_status_writer.publish_events:
+        container.task_events.bind(functools.partial(_publish_task_events, broker))
+
+    conf = settings.worker_consumer
+    max_in_flight = conf.max_in_flight or container.task_pipeline.depth
+    prefetch_count = conf.prefetch_count or max_in_flight
+    logger.info(
+        "worker.consumer.configured",
+        extra={
+            "max_in_flight": max_in_flight,
+            "prefetch_count": prefetch_count,
+            "pipeline_depth": container.task_pipeline.depth,
+            "ack_after_upload": conf.ack_after_upload,
+            "queues": [process_image_queues[TaskSize(task_size)].name for task_size in conf.task_sizes],
+        },
+    )
+
+    process_images = _task_handler(container, max_in_flight)
+    # Один канал на все очереди с global_qos: prefetch_count ограничивает сообщения воркера в сумме,
+    # а не на каждого подписчика. Только ручное подтверждение: для no_ack RabbitMQ не применяет prefetch
+    channel = Channel(prefetch_count=prefetch_count, global_qos=True)
+
+    # Отдельные пулы воркеров для маленьких и больших сцен, лимит задач в работе общий для всех очередей
+    for task_size in conf.task_sizes:
+        broker.subscriber(process_image_queues[TaskSize(task_size)], channel=channel)(process_images)
+
+    @app.after_shutdown
+    async def close_container() -> None:
+        await container.close()
 
     # broker.include_router(router)
     return app
+
+
+def _task_handler(
+    container: NeuroApiContainer, max_in_flight: int
+) -> Callable[[uuid.UUID, RabbitMessage], Awaitable[None]]:
+    ack_after_upload = settings.worker_consumer.ack_after_upload
+    # Сообщения сверх max_in_flight ждут здесь, а не захватывают буферы стадий конвейера
+    in_flight_limit = asyncio.Semaphore(max_in_flight)
+    in_flight = 0
+
+    async def process_images(task_id: uuid.UUID, message: RabbitMessage) -> None:
+        nonlocal in_flight
+        async with in_flight_limit:
+            if not ack_after_upload:
+                # Подтверждение при взятии в работу, prefetch по-прежнему ограничивает сообщения в памяти
+                await message.ack()
+            in_flight += 1
+            logger.info("image.processing.started", extra={"task_id": task_id, "in_flight": in_flight})
+            try:
+                await container.task_pipeline.submit(task_id)
+                logger.info("imaged.processed", extra={"task_id": task_id, "in_flight": in_flight})
+            except Exception as e:
+                logger.exception("processing.image.error.occurred", extra={"task_id": task_id}, exc_info=e)
+                raise
+            finally:
+                in_flight -= 1
+        if ack_after_upload:
+            # Подтверждение только после выгрузки результата, упавший воркер вернёт задачу в очередь
+            await message.ack()
+
+    return process_images
+
+
+async def _publish_task_events(broker: RabbitBroker, events: list[TaskStatusEvent]) -> None:
+    """Смены статусов и прогресс задач для процессов API"""
+    await broker.publish([event.model_dump(mode="json") for event in events], exchange=task_status_exchange)
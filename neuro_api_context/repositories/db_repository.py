@@ -2,7 +2,7 @@ import logging
 import uuid
 from dataclasses import dataclass
 
-from sqlalchemy import update
+from sqlalchemy import String, column, func, or_, update, values
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from backend_context.persistent.pg.api import ImageProcess as ImageProcessRecord
@@ -11,23 +11,43 @@ from backend_context.persistent.pg.api import ImageProcessing
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True, frozen=True)
+class TaskStatusUpdate:
+    task_id: uuid.UUID
+    status: ImageProcessing
+    model_version: str | None = None
+
+
 @dataclass(slots=True, frozen=True)
 class DBRepository:
     _engine_rw: async_sessionmaker[AsyncSession]
     _engine_ro: async_sessionmaker[AsyncSession]
 
-    async def update_task_status(self, task_id: uuid.UUID, new_status: ImageProcessing) -> bool:
+    async def update_task_statuses(self, updates: list[TaskStatusUpdate]) -> set[uuid.UUID]:
+        """
+        Один UPDATE ... FROM (VALUES ...) на пачку задач, одна транзакция
+
+        READY не перезаписывается другим статусом, поэтому запоздавший PROCESSING
+        повторно доставленной задачи не откатывает готовую. Возвращает обновлённые task_id.
+        """
+        rows = values(
+            column("task_id", ImageProcessRecord.task_id.type),
+            column("status", ImageProcessRecord.status.type),
+            column("model_version", String),
+            name="updates",
+        ).data([(u.task_id, u.status, u.model_version) for u in updates])
         stmt = (
             update(ImageProcessRecord)
-            .where(ImageProcessRecord.task_id == task_id)
-            .values(status=new_status)
-            .returning(ImageProcessRecord.id)
+            .where(ImageProcessRecord.task_id == rows.c.task_id)
+            .where(or_(ImageProcessRecord.status != ImageProcessing.READY, rows.c.status == ImageProcessing.READY))
+            .values(
+                status=rows.c.status,
+                model_version=func.coalesce(rows.c.model_version, ImageProcessRecord.model_version),
+            )
+            .returning(ImageProcessRecord.task_id)
         )
 
         async with self._engine_rw() as session:
-            res = (await session.execute(stmt)).first()
+            updated = set((await session.execute(stmt)).scalars())
             await session.commit()
-        if res is None:
-            logger.warning("task.status.not.updated", extra={"task_id": task_id})
-            return False
-        return True
+        return updated
@@ -0,0 +1,112 @@
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class InputCache:
+    def __init__(self, directory: Path, max_size_bytes: int):
+        """
+        LRU кэш скачанных входов на локальном диске
+
+        Запись определяется ключом объекта и его ETag, поэтому перезаписанный
+        объект в кэше не найдётся. Файл пишется во временный и переименовывается,
+        так что упавший на середине воркер не оставит обрезанную запись.
+        Время последнего обращения хранится в mtime файла, порядок LRU
+        переживает перезапуск. get и put закрепляют запись за вызывающим, пока
+        тот не вызовет release: закреплённый файл не вытесняется до декодирования.
+        Методы блокирующие, их вызывают в пуле потоков.
+        """
+        self._directory = directory
+        self._max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        # Имя файла -> размер, от давно использованных к недавним
+        self._entries: collections.OrderedDict[str, int] = collections.OrderedDict()
+        # Имя файла -> число задач, которые его ещё читают
+        self._pins: collections.Counter[str] = collections.Counter()
+        self._size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        directory.mkdir(parents=True, exist_ok=True)
+        files = [path for path in directory.glob("*.tif") if path.is_file()]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._size_bytes += size
+        # Недописанные файлы прошлого запуска
+        for path in directory.glob("*.tmp"):
+            path.unlink(missing_ok=True)
+        self._evict()
+
+    def get(self, key: str, etag: str) -> Path | None:
+        name = self._file_name(key, etag)
+        path = self._directory / name
+        with self._lock:
+            if name not in self._entries or not path.exists():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self._pins[name] += 1
+            self.hits += 1
+        os.utime(path)
+        return path
+
+    def put(self, key: str, etag: str, data: bytes) -> Path:
+        name = self._file_name(key, etag)
+        path = self._directory / name
+        fd, tmp_name = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._size_bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._pins[name] += 1
+            self._evict()
+        return path
+
+    def release(self, path: Path) -> None:
+        """Снятие закрепления get/put, отложенное вытеснение выполняется сразу"""
+        with self._lock:
+            self._pins[path.name] -= 1
+            if self._pins[path.name] <= 0:
+                del self._pins[path.name]
+            self._evict()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+            }
+
+    def _evict(self) -> None:
+        # Закреплённые файлы, в том числе только что записанный, не удаляются, даже если они больше бюджета
+        for name in [name for name in self._entries if name not in self._pins]:
+            if self._size_bytes <= self._max_size_bytes:
+                break
+            size = self._entries.pop(name)
+            self._size_bytes -= size
+            # Открытый GDAL файл остаётся читаемым до закрытия
+            (self._directory / name).unlink(missing_ok=True)
+            logger.info("input.cache.evicted", extra={"file": name, "size_bytes": size})
+
+    @staticmethod
+    def _file_name(key: str, etag: str) -> str:
+        digest = hashlib.sha256(key.encode())
+        digest.update(b"\0")
+        digest.update(etag.encode())
+        return f"{digest.hexdigest()}.tif"
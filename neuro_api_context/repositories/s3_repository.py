@@ -1,46 +1,149 @@
+import asyncio
 import logging
 import uuid
 from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
 
 import botocore.exceptions
-from aioboto3 import Session
 
+from base.infrastructure.s3.gdal import vsis3_path
+from base.infrastructure.s3.transfer import S3Transfer
 from base.settings import settings
+from neuro_api_context.repositories.input_cache import InputCache
 
 logger = logging.getLogger(__name__)
 
+# Попытки скачать объект, который перезаписывают между HEAD и GET
+_ETAG_ATTEMPTS = 3
+
 
 @dataclass(slots=True, frozen=True)
 class S3Repository:
-    _s3_session: Session
+    _s3_transfer: S3Transfer
+    _input_cache: InputCache | None = None
 
     async def upload_result(self, task_id: uuid.UUID, result_content: bytes) -> None:
-        async with self._s3_session.client("s3", endpoint_url=settings.s3_config.endpoint_url) as s3:
-            result_key = self._build_key(task_id=task_id, key_name="result.tif")
-            await s3.put_object(Bucket=settings.s3_config.bucket_name, Key=result_key, Body=result_content)
-            logger.info("loaded.result.image", extra={"task_id": task_id, "image_size_bytes": len(result_key)})
-
-    async def download_images(self, task_id: uuid.UUID) -> tuple[bytes, bytes]:
-        async with self._s3_session.client("s3", endpoint_url=settings.s3_config.endpoint_url) as s3:
-            try:
-                optical_key = self._build_key(task_id=task_id, key_name="optical.tif")
-                optical_response = await s3.get_object(Bucket=settings.s3_config.bucket_name, Key=optical_key)
-                async with optical_response["Body"] as stream:
-                    optical_content = await stream.read()
-
-                sar_key = self._build_key(task_id=task_id, key_name="sar.tif")
-                sar_response = await s3.get_object(Bucket=settings.s3_config.bucket_name, Key=sar_key)
-                async with sar_response["Body"] as stream:
-                    sar_content = await stream.read()
-
-                logger.info("download.images.success", extra={"task_id": task_id})
-            except botocore.exceptions.ClientError as e:
-                error_code = e.response["Error"]["Code"]
-                if error_code == "NoSuchKey":
-                    logger.warning("downloading.images.not.found", extra={"task_id": task_id})
-                    return b"", b""
-                raise
-            return optical_content, sar_content
+        result_key = self._build_key(task_id=task_id, key_name="result.tif")
+        await self._s3_transfer.put(result_key, result_content)
+        logger.info("loaded.result.image", extra={"task_id": task_id, "image_size_bytes": len(result_content)})
+
+    async def download_images(self, task_id: uuid.UUID) -> tuple[bytes | Path, bytes | Path]:
+        """
+        Содержимое входных снимков, при включённом локальном кэше - пути к файлам в нём
+
+        С кэшем сначала запрашиваются ETag, скачиваются только объекты, которых нет на диске.
+        Файлы кэша закреплены до release_images, вызывающий освобождает их после декодирования.
+        """
+        try:
+            if self._input_cache is None:
+                optical_content, sar_content = await self._s3_transfer.get_many(
+                    self._build_key(task_id=task_id, key_name="optical.tif"),
+                    self._build_key(task_id=task_id, key_name="sar.tif"),
+                )
+            else:
+                optical_content, sar_content = await self._download_cached_pair(task_id, self._input_cache)
+            logger.info("download.images.success", extra={"task_id": task_id})
+        except botocore.exceptions.ClientError as e:
+            error_code = e.response["Error"]["Code"]
+            if error_code in ("NoSuchKey", "404"):
+                logger.warning("downloading.images.not.found", extra={"task_id": task_id})
+                return b"", b""
+            raise
+        return optical_content, sar_content
+
+    async def release_images(self, *images: bytes | Path) -> None:
+        """Снятие закрепления файлов входного кэша, которые вернул download_images"""
+        if self._input_cache is None:
+            return
+        for image in images:
+            if isinstance(image, Path):
+                await asyncio.to_thread(self._input_cache.release, image)
+
+    async def head_images(self, task_id: uuid.UUID) -> tuple[str, str]:
+        """ETag входных снимков, без скачивания содержимого"""
+        optical, sar = await asyncio.gather(
+            self._s3_transfer.head(self._build_key(task_id=task_id, key_name="optical.tif")),
+            self._s3_transfer.head(self._build_key(task_id=task_id, key_name="sar.tif")),
+        )
+        return optical["ETag"].strip('"'), sar["ETag"].strip('"')
+
+    def input_paths(self, task_id: uuid.UUID) -> tuple[str, str]:
+        """Пути GDAL /vsis3/ входных снимков для чтения окнами"""
+        return (
+            vsis3_path(self._build_key(task_id=task_id, key_name="optical.tif")),
+            vsis3_path(self._build_key(task_id=task_id, key_name="sar.tif")),
+        )
+
+    async def restore_cached_result(self, cache_key: str, task_id: uuid.UUID) -> bool:
+        """Серверное копирование результата из кэша, промах стоит одного запроса"""
+        try:
+            await self._s3_transfer.copy(
+                self._build_cache_key(cache_key), self._build_key(task_id=task_id, key_name="result.tif")
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return False
+            raise
+        return True
+
+    async def store_cached_result(self, cache_key: str, task_id: uuid.UUID) -> None:
+        await self._s3_transfer.copy(
+            self._build_key(task_id=task_id, key_name="result.tif"), self._build_cache_key(cache_key)
+        )
+
+    async def list_cached_results(self) -> list[dict[str, Any]]:
+        """Ключи, размеры и даты изменения всех записей кэша результатов"""
+        prefix = self._build_cache_key("")
+        objects = []
+        paginator = self._s3_transfer.client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=self._s3_transfer.bucket, Prefix=prefix):
+            objects.extend(page.get("Contents", []))
+        return objects
+
+    async def delete_objects(self, keys: list[str]) -> None:
+        # DeleteObjects принимает не больше 1000 ключей за запрос
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start : start + 1000]
+            await self._s3_transfer.client.delete_objects(
+                Bucket=self._s3_transfer.bucket,
+                Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True},
+            )
+
+    async def _download_cached_pair(self, task_id: uuid.UUID, input_cache: InputCache) -> tuple[Path, Path]:
+        optical, sar = await asyncio.gather(
+            self._download_cached(self._build_key(task_id=task_id, key_name="optical.tif"), input_cache),
+            self._download_cached(self._build_key(task_id=task_id, key_name="sar.tif"), input_cache),
+            return_exceptions=True,
+        )
+        # Скачанный снимок пары не остаётся закреплённым, если второй не скачался
+        for result in (optical, sar):
+            if isinstance(result, BaseException):
+                await self.release_images(*(image for image in (optical, sar) if isinstance(image, Path)))
+                raise result
+        return optical, sar
+
+    async def _download_cached(self, key: str, input_cache: InputCache) -> Path:
+        attempt = 1
+        while True:
+            etag = (await self._s3_transfer.head(key))["ETag"]
+            path = await asyncio.to_thread(input_cache.get, key, etag.strip('"'))
+            hit = path is not None
+            if path is None:
+                try:
+                    content = await self._s3_transfer.get(key, if_match=etag)
+                except botocore.exceptions.ClientError as e:
+                    # Объект перезаписан после HEAD: новые байты не должны попасть в кэш под старым ETag
+                    if e.response["Error"]["Code"] not in ("PreconditionFailed", "412") or attempt == _ETAG_ATTEMPTS:
+                        raise
+                    attempt += 1
+                    continue
+                path = await asyncio.to_thread(input_cache.put, key, etag.strip('"'), content)
+            logger.info("input.cache.hit" if hit else "input.cache.miss", extra={"key": key, **input_cache.stats()})
+            return path
+
+    def _build_cache_key(self, cache_key: str) -> str:
+        return f"{settings.s3_config.bucket_name}/{settings.result_cache.prefix}{cache_key}"
 
     def _build_key(self, task_id: uuid.UUID, key_name: str) -> str:
         return self._build_s3_path(task_id=task_id) + key_name
@@ -1,11 +1,19 @@
-import io
+import contextlib
 import logging
-from io import BytesIO
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
-import rasterio
 import torch
 
+from base.settings import OutputProfile, RasterCompression
+
+if TYPE_CHECKING:
+    from rasterio.io import DatasetReader, DatasetWriter
+    from rasterio.windows import Window
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +23,10 @@ class ImageProcessor:
         s2_max_reflectance: float = 3000.0,
         s1_clip_min: tuple[float, float] = (-25.0, -32.5),  # VV, VH
         s1_clip_max: tuple[float, float] = (0.0, 0.0),
+        channels_last: bool = False,
+        max_pooled_bytes: int = 2 * 1024**3,
+        max_pooled_buffer_bytes: int = 1024**3,
+        output_profile: OutputProfile | None = None,
     ):
         """
         Класс для предобработки данных Sentinel-1 и Sentinel-2
@@ -24,6 +36,11 @@ class ImageProcessor:
         - s2_max_reflectance: максимальное значение отражательной способности S2
         - s1_clip_min: минимальные значения для клиппинга S1 (VV, VH)
         - s1_clip_max: максимальные значения для клиппинга S1 (VV, VH)
+        - channels_last: preprocess отдаёт тензор в раскладке NHWC
+        - max_pooled_bytes: суммарный объём освобождённых 15-канальных буферов, которые ждут следующих задач,
+          0 отключает пул (prepare в пуле процессов: буфер в родителе - копия, дочерний процесс его не получит)
+        - max_pooled_buffer_bytes: буферы больше этого освобождаются сразу, одна большая сцена не держит память
+        - output_profile: формат результата postprocess (COG, тайлы, сжатие, обзоры)
         """
         # Параметры нормализации S2
         self.s2_max_reflectance = s2_max_reflectance
@@ -34,74 +51,241 @@ class ImageProcessor:
         self.s1_denominator = self.s1_clip_max - self.s1_clip_min
         self.s1_denominator[self.s1_denominator == 0] = 1e-6
 
-    def _load_and_validate_image(self, data: bytes, expected_channels: int) -> np.ndarray:
-        with rasterio.open(BytesIO(data), driver="GTiff") as src:
-            img = src.read()
-            if img.shape[0] != expected_channels:
-                raise ValueError(f"Expected {expected_channels} channels, got {img.shape[0]}")
-            return img
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+
+        self.output_profile = output_profile or OutputProfile()
+
+        self._max_pooled_bytes = max_pooled_bytes
+        self._max_pooled_buffer_bytes = max_pooled_buffer_bytes
+        self._pooled_buffers: list[np.ndarray] = []
+        self._pool_lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Для пула процессов: блокировка не сериализуется, буферы пула не стоит гонять через pickle
+        state = self.__dict__.copy()
+        del state["_pool_lock"]
+        state["_pooled_buffers"] = []
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+
+    def _load_and_validate_image(self, data: bytes | Path, expected_channels: int) -> np.ndarray:
+        with self._open_geotiff(data) as src:
+            self._validate_channels(src, expected_channels)
+            return src.read()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _open_geotiff(data: bytes | Path) -> Iterator["DatasetReader"]:
+        """
+        Чтение GeoTIFF прямо из скачанного буфера или файла локального кэша
+
+        MemoryFile с bytes отдаёт GDAL указатель на сам буфер без копирования,
+        memoryview, bytearray и mmap копируются, поэтому передаются именно bytes.
+        Файл открывается по пути, несжатые данные GDAL отображает в память сам.
+        """
+        import rasterio  # GDAL грузится при первом декодировании, а не на старте воркера
+        from rasterio.io import MemoryFile
+
+        if isinstance(data, Path):
+            with rasterio.Env(GTIFF_VIRTUAL_MEM_IO="IF_ENOUGH_RAM"), rasterio.open(data) as src:
+                yield src
+            return
+
+        with MemoryFile(data) as memfile, memfile.open(driver="GTiff") as src:
+            yield src
 
     def _handle_nan(self, data: np.ndarray) -> np.ndarray:
-        """Обработка NaN значений (замена на среднее по каналу)"""
-        data = data.astype(np.float32)
-        for i in range(data.shape[0]):
-            channel = data[i]
-            if np.isnan(channel).any():
-                nan_mask = np.isnan(channel)
-                channel_mean = np.nanmean(channel)
-                channel[nan_mask] = channel_mean
+        """Замена NaN на среднее по каналу на месте, data (C, H, W) float32"""
+        nan_mask = np.isnan(data)
+        if not nan_mask.any():
+            return data
+
+        valid = data.shape[1] * data.shape[2] - np.count_nonzero(nan_mask, axis=(1, 2))
+        np.copyto(data, 0.0, where=nan_mask)
+        # Канал целиком из NaN остаётся NaN, как у np.nanmean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            channel_mean = (data.sum(axis=(1, 2), dtype=np.float64) / valid).astype(np.float32)
+        np.copyto(data, channel_mean.reshape(-1, 1, 1), where=nan_mask)
         return data
 
     def _normalize_s2(self, s2_data: np.ndarray) -> np.ndarray:
-        """Нормализация данных Sentinel-2"""
-        s2_processed = self._handle_nan(s2_data)
-        s2_norm = (s2_processed / self.s2_max_reflectance) * 2.0 - 1.0
-        return np.clip(s2_norm, -1.0, 1.0)
+        """Нормализация данных Sentinel-2 на месте"""
+        np.divide(s2_data, self.s2_max_reflectance, out=s2_data)
+        s2_data *= 2.0
+        s2_data -= 1.0
+        return np.clip(s2_data, -1.0, 1.0, out=s2_data)
 
     def _normalize_s1(self, s1_data: np.ndarray) -> np.ndarray:
-        """Нормализация данных Sentinel-1"""
-        s1_processed = self._handle_nan(s1_data)
-        s1_clipped = np.clip(s1_processed, self.s1_clip_min, self.s1_clip_max)
-        s1_norm = ((s1_clipped - self.s1_clip_min) / self.s1_denominator) * 2.0 - 1.0
-        return np.clip(s1_norm, -1.0, 1.0)
+        """Нормализация данных Sentinel-1 на месте"""
+        np.clip(s1_data, self.s1_clip_min, self.s1_clip_max, out=s1_data)
+        s1_data -= self.s1_clip_min
+        s1_data /= self.s1_denominator
+        s1_data *= 2.0
+        s1_data -= 1.0
+        return np.clip(s1_data, -1.0, 1.0, out=s1_data)
 
-    def preprocess(self, s2_cloudy_bytes: bytes, s1_bytes: bytes) -> torch.Tensor:
-        s2_cloudy = self._load_and_validate_image(s2_cloudy_bytes, 13)
-        s1 = self._load_and_validate_image(s1_bytes, 2)
+    def prepare(self, s2_cloudy_bytes: bytes | Path, s1_bytes: bytes | Path) -> np.ndarray:
+        """
+        Декодирование и нормализация пары снимков в массив (15, H, W) float32
 
-        s2_norm = self._normalize_s2(s2_cloudy)
-        s1_norm = self._normalize_s1(s1)
+        Оба снимка читаются GDAL сразу во float32 каналы одного буфера из пула,
+        NaN заполняются и масштабирование выполняется на месте без промежуточных копий.
+        Вызывающий возвращает буфер через release, когда массив больше не нужен.
+        """
+        with self._open_geotiff(s2_cloudy_bytes) as s2_src, self._open_geotiff(s1_bytes) as s1_src:
+            height, width = self.validate_pair(s2_src, s1_src)
+            scene = self._acquire_buffer((15, height, width))
+            try:
+                return self.read_normalized(s2_src, s1_src, scene)
+            except BaseException:
+                self.release(scene)
+                raise
 
-        combined = np.concatenate([s2_norm, s1_norm], axis=0)
+    def validate_pair(self, s2_src: "DatasetReader", s1_src: "DatasetReader") -> tuple[int, int]:
+        self._validate_channels(s2_src, 13)
+        self._validate_channels(s1_src, 2)
+        if s2_src.shape != s1_src.shape:
+            raise ValueError(f"S2 and S1 sizes differ: {s2_src.shape} != {s1_src.shape}")
+        return s2_src.shape
+
+    def read_normalized(
+        self,
+        s2_src: "DatasetReader",
+        s1_src: "DatasetReader",
+        out: np.ndarray,
+        window: "Window | None" = None,
+    ) -> np.ndarray:
+        """
+        Чтение окна (или всего снимка) пары в out (15, h, w) float32 с нормализацией на месте
+
+        NaN заполняются средним по прочитанному окну, для всего снимка это среднее по каналу.
+        """
+        for src, channels in ((s2_src, out[:13]), (s1_src, out[13:])):
+            src.read(out=channels, window=window)
+            # В целочисленных снимках NaN быть не может
+            if np.issubdtype(np.dtype(src.dtypes[0]), np.floating):
+                self._handle_nan(channels)
+
+        self._normalize_s2(out[:13])
+        self._normalize_s1(out[13:])
+        return out
+
+    def release(self, scene: np.ndarray) -> None:
+        """Возврат буфера prepare в пул для следующей задачи"""
+        if scene.nbytes > min(self._max_pooled_buffer_bytes, self._max_pooled_bytes):
+            return
+        with self._pool_lock:
+            self._pooled_buffers.append(scene)
+            # Буферы сцен других размеров вытесняются в порядке поступления
+            while sum(buffer.nbytes for buffer in self._pooled_buffers) > self._max_pooled_bytes:
+                self._pooled_buffers.pop(0)
+
+    def _acquire_buffer(self, shape: tuple[int, int, int]) -> np.ndarray:
+        with self._pool_lock:
+            for i, buffer in enumerate(self._pooled_buffers):
+                if buffer.shape == shape:
+                    return self._pooled_buffers.pop(i)
+        return np.empty(shape, dtype=np.float32)
+
+    @staticmethod
+    def _validate_channels(src: "DatasetReader", expected_channels: int) -> None:
+        if src.count != expected_channels:
+            raise ValueError(f"Expected {expected_channels} channels, got {src.count}")
+
+    def preprocess(self, s2_cloudy_bytes: bytes, s1_bytes: bytes) -> torch.Tensor:
+        combined = self.prepare(s2_cloudy_bytes, s1_bytes)
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        tensor = torch.from_numpy(combined).unsqueeze(0).to(device).float()
+        tensor = torch.from_numpy(combined).unsqueeze(0).to(device, memory_format=self.memory_format).float()
 
         return tensor
 
-    def postprocess(self, output_tensor: torch.Tensor) -> bytes:
+    def to_uint16(self, output: torch.Tensor | np.ndarray) -> np.ndarray:
+        """Денормализация выхода модели в снимок uint16"""
+        image = output.squeeze().cpu().numpy() if isinstance(output, torch.Tensor) else output
+
+        # Денормализация
+        image = (image + 1.0) / 2.0 * self.s2_max_reflectance
+        image = np.clip(image, 0, self.s2_max_reflectance)
+
+        # Конвертация в uint16
+        return (image * 65535 / self.s2_max_reflectance).astype(np.uint16)
+
+    def postprocess(self, output: torch.Tensor | np.ndarray) -> bytes:
+        """Кодирование в GeoTIFF, результат единственной копией выходит из памяти GDAL и сразу идёт в S3"""
         try:
-            image = output_tensor.squeeze().cpu().numpy()
-
-            # Денормализация
-            image = (image + 1.0) / 2.0 * self.s2_max_reflectance
-            image = np.clip(image, 0, self.s2_max_reflectance)
-
-            # Конвертация в uint16
-            image = (image * 65535 / self.s2_max_reflectance).astype(np.uint16)
-
-            # print(f"Форма тензора {image.shape}")
-            # Сохранение в байты
-            with io.BytesIO() as buffer:
-                with rasterio.io.MemoryFile(buffer) as memfile:
-                    with memfile.open(
-                        driver="GTiff",
-                        height=image.shape[1],
-                        width=image.shape[2],
-                        count=image.shape[0],
-                        dtype=image.dtype,
-                    ) as dst:
-                        dst.write(image)
-                    buffer.write(memfile.read())
-                return buffer.getvalue()
+            return self.encode(self.to_uint16(output))
         except Exception as e:
             logger.exception("Ошибка постобработки", extra={"error": str(e)})
+
+    def encode(self, image: np.ndarray) -> bytes:
+        """
+        Запись снимка (C, H, W) в GeoTIFF по output_profile
+
+        Снимок меньше блока по любой стороне пишется полосами без COG: тайл
+        дополнялся бы до block_size и без сжатия раздувал файл в десятки раз.
+        COG пишется одноимённым драйвером прямо в результирующий MemoryFile.
+        """
+        from rasterio.io import MemoryFile
+
+        profile = self.output_profile
+        tiled = min(image.shape[1], image.shape[2]) >= profile.block_size
+        dataset = {
+            "height": image.shape[1],
+            "width": image.shape[2],
+            "count": image.shape[0],
+            "dtype": image.dtype,
+        }
+        if profile.cog and tiled:
+            dataset.update(driver="COG", **self._cog_options())
+        else:
+            dataset.update(driver="GTiff", **self._gtiff_options(tiled))
+
+        with MemoryFile() as memfile:
+            with memfile.open(**dataset) as dst:
+                dst.write(image)
+                self._build_overviews(dst)
+            return memfile.read()
+
+    def _build_overviews(self, dst: "DatasetWriter") -> None:
+        from rasterio.enums import Resampling
+
+        if self.output_profile.overview_levels:
+            dst.build_overviews(
+                self.output_profile.overview_levels, Resampling[self.output_profile.overview_resampling]
+            )
+
+    def _gtiff_options(self, tiled: bool) -> dict[str, Any]:
+        profile = self.output_profile
+        # Настройки хранят значения enum строками (use_enum_values), значения по умолчанию - членами enum
+        compression = RasterCompression(profile.compression)
+        options: dict[str, Any] = {"tiled": tiled, "compress": compression.value}
+        if tiled:
+            options.update(blockxsize=profile.block_size, blockysize=profile.block_size)
+        if compression != RasterCompression.NONE:
+            options["predictor"] = profile.predictor
+            if profile.compression_level is not None:
+                level_option = "zstd_level" if compression == RasterCompression.ZSTD else "zlevel"
+                options[level_option] = profile.compression_level
+        return options
+
+    def _cog_options(self) -> dict[str, Any]:
+        profile = self.output_profile
+        compression = RasterCompression(profile.compression)
+        options: dict[str, Any] = {
+            "compress": compression.value,
+            "blocksize": profile.block_size,
+            # Обзоры заданных уровней строятся до записи, драйвер берёт готовые
+            "overviews": "FORCE_USE_EXISTING" if profile.overview_levels else "NONE",
+            "bigtiff": "IF_SAFER",
+        }
+        if compression != RasterCompression.NONE:
+            options["predictor"] = _COG_PREDICTORS[profile.predictor]
+            if profile.compression_level is not None:
+                options["level"] = profile.compression_level
+        return options
+
+
+_COG_PREDICTORS = {1: "NO", 2: "STANDARD", 3: "FLOATING_POINT"}
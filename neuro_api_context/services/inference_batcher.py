@@ -0,0 +1,158 @@
+import asyncio
+import contextlib
+import functools
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+
+from base.infrastructure.executor.pool import BoundedExecutor
+from neuro_api_context.services.ml_evaluator import OUT_CHANNELS, MLModelService
+from neuro_api_context.services.tiled_inference import SceneSource, TileWindow
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _BatchItem:
+    tiles: np.ndarray
+    model: MLModelService
+    future: asyncio.Future[np.ndarray]
+
+
+class InferenceBatcher:
+    def __init__(
+        self,
+        executor: BoundedExecutor,
+        max_batch_size: int,
+        max_wait: timedelta,
+    ):
+        """
+        Объединяет тайлы нескольких одновременно обрабатываемых задач в один прямой проход
+
+        Пачка отправляется в модель, когда набрано max_batch_size тайлов, истекло
+        max_wait с момента прихода первого тайла или каждая активная задача уже
+        положила в очередь свою порцию и ждать больше некого. Прямые проходы
+        выполняются в executor, одновременно не больше его max_concurrency,
+        следующая пачка набирается, пока модель занята предыдущей.
+        В одну пачку попадают только тайлы задач, закреплённых за одной версией модели.
+        """
+        if max_batch_size <= 0:
+            raise ValueError(f"Max batch size must be positive, got {max_batch_size}")
+
+        self._executor = executor
+        self._slots = asyncio.Semaphore(executor.max_concurrency)
+        self._running: set[asyncio.Task[None]] = set()
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait.total_seconds()
+        self._queue: asyncio.Queue[_BatchItem] = asyncio.Queue()
+        self._carry: _BatchItem | None = None
+        self._active_streams = 0
+        self._worker: asyncio.Task[None] | None = None
+
+    async def predict_scene(
+        self,
+        scene: np.ndarray | SceneSource,
+        model: MLModelService,
+        extract_fn: Callable[[list[TileWindow]], Awaitable[np.ndarray]] | None = None,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> np.ndarray:
+        async with self._stream():
+            return await model.tiler.apredict(
+                scene,
+                functools.partial(self.submit, model=model),
+                out_channels=OUT_CHANNELS,
+                extract_fn=extract_fn,
+                on_progress=on_progress,
+            )
+
+    async def submit(self, tiles: np.ndarray, model: MLModelService) -> np.ndarray:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="inference-batcher")
+
+        item = _BatchItem(tiles=tiles, model=model, future=asyncio.get_running_loop().create_future())
+        self._queue.put_nowait(item)
+        return await item.future
+
+    async def close(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._worker
+        self._worker = None
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    @contextlib.asynccontextmanager
+    async def _stream(self) -> AsyncIterator[None]:
+        self._active_streams += 1
+        try:
+            yield
+        finally:
+            self._active_streams -= 1
+
+    async def _run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            batch = await self._collect()
+            task = asyncio.create_task(self._execute(batch))
+            self._running.add(task)
+            task.add_done_callback(self._on_executed)
+
+    def _on_executed(self, task: asyncio.Task[None]) -> None:
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _collect(self) -> list[_BatchItem]:
+        first = self._carry or await self._queue.get()
+        self._carry = None
+        batch, size = [first], len(first.tiles)
+        deadline = asyncio.get_running_loop().time() + self._max_wait
+
+        while size < self._max_batch_size:
+            if self._queue.empty() and 0 < self._active_streams <= len(batch):
+                break
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            if (
+                size + len(item.tiles) > self._max_batch_size
+                or item.tiles.shape[1:] != first.tiles.shape[1:]
+                or item.model is not first.model
+            ):
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item.tiles)
+
+        return batch
+
+    async def _execute(self, batch: list[_BatchItem]) -> None:
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+
+        model = batch[0].model
+        try:
+            chunks = [item.tiles for item in batch]
+            tiles = chunks[0] if len(chunks) == 1 else model.tiler.concatenate(chunks)
+            predictions = await self._executor.run(model.predict_batch, tiles)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        logger.debug("inference.batch.done", extra={"tasks": len(batch), "tiles": len(tiles)})
+        offset = 0
+        for item in batch:
+            count = len(item.tiles)
+            if not item.future.done():
+                item.future.set_result(predictions[offset : offset + count])
+            offset += count
@@ -1,23 +1,97 @@
 from dataclasses import dataclass
 
+import numpy as np
 import torch
+from torch import nn
 
-from base.settings import settings
-
+from base.settings import ModelPrecision, settings
+from neuro_api_context.ml.optimization import load_optimized_model
+from neuro_api_context.ml.quantization import load_quantized_model, quantized_model_path
+from neuro_api_context.ml.weights import load_state_dict
 from neuro_api_context.presentation.ml.model import GeneratorUNet
+from neuro_api_context.services.tiled_inference import TiledInference
+
+OUT_CHANNELS = 13
 
 
 @dataclass(frozen=True, slots=True)
 class MLModelService:
-    _model: GeneratorUNet
+    _model: nn.Module
+    _tiler: TiledInference
+    _device: torch.device
+    _memory_format: torch.memory_format = torch.contiguous_format
+    _autocast: bool = False
+
+    @classmethod
+    def default_device(cls) -> torch.device:
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    @classmethod
+    def memory_format_from_settings(cls) -> torch.memory_format:
+        return torch.channels_last if settings.ml_model.channels_last else torch.contiguous_format
+
+    @classmethod
+    def autocast_from_settings(cls) -> bool:
+        return settings.ml_model.precision == ModelPrecision.BF16
+
+    @classmethod
+    def build(cls, weights_path: str, device: torch.device) -> "MLModelService":
+        return cls(
+            _model=cls.load_model(device, weights_path),
+            _tiler=cls.tiler_from_settings(),
+            _device=device,
+            _memory_format=cls.memory_format_from_settings(),
+            _autocast=cls.autocast_from_settings(),
+        )
+
+    @classmethod
+    def load_model(cls, device: torch.device, weights_path: str | None = None) -> nn.Module:
+        weights_path = weights_path or settings.ml_model.ml_model_path
+        if settings.ml_model.precision == ModelPrecision.INT8:
+            return load_quantized_model(quantized_model_path(weights_path), device)
+        if not settings.ml_model.optimize:
+            return cls.load_eager_model(device, weights_path)
+        return load_optimized_model(
+            weights_path,
+            device,
+            lambda: cls.load_eager_model(device, weights_path),
+            variant=str(cls.memory_format_from_settings()),
+        )
 
     @classmethod
-    def load_model(cls, device: str = "cuda" if torch.cuda.is_available() else "cpu"):
-        model = GeneratorUNet(in_channels=15, out_channels=13)
-        model.load_state_dict(torch.load(settings.ml_model.ml_model_path, map_location=device, weights_only=False))
+    def load_eager_model(cls, device: torch.device, weights_path: str | None = None) -> GeneratorUNet:
+        model = GeneratorUNet(in_channels=15, out_channels=OUT_CHANNELS)
+        # assign=True keeps memory-mapped tensors instead of copying them into freshly allocated parameters
+        model.load_state_dict(load_state_dict(weights_path or settings.ml_model.ml_model_path, device), assign=True)
         model.eval()
-        return model
+        return model.to(memory_format=cls.memory_format_from_settings())
+
+    @classmethod
+    def tiler_from_settings(cls) -> TiledInference:
+        return TiledInference(
+            tile_size=settings.ml_model.tile_size,
+            overlap=settings.ml_model.tile_overlap,
+            batch_size=settings.ml_model.tile_batch_size,
+            channels_last=settings.ml_model.channels_last,
+        )
 
     def predict(self, input_tensor: torch.Tensor) -> torch.Tensor:
-        with torch.no_grad():
-            return self._model(input_tensor)
+        with torch.no_grad(), torch.autocast(self._device.type, dtype=torch.bfloat16, enabled=self._autocast):
+            return self._model(input_tensor.to(self._device, memory_format=self._memory_format))
+
+    def warm_up(self) -> None:
+        """Один прямой проход на тайле полного размера, чтобы первая задача не платила за инициализацию ядер"""
+        size = self._tiler.tile_size
+        self.predict_batch(
+            self._tiler.extract(np.zeros((15, size, size), dtype=np.float32), self._tiler.windows(size, size))
+        )
+
+    def predict_batch(self, tiles: np.ndarray) -> np.ndarray:
+        return self.predict(torch.from_numpy(tiles)).float().cpu().numpy()
+
+    def predict_scene(self, scene: np.ndarray) -> np.ndarray:
+        return self._tiler.predict(scene, self.predict_batch, out_channels=OUT_CHANNELS)
+
+    @property
+    def tiler(self) -> TiledInference:
+        return self._tiler
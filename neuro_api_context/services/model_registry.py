@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+
+import torch
+
+from base.settings import settings
+from neuro_api_context.ml.optimization import weights_digest
+from neuro_api_context.services.ml_evaluator import MLModelService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class LoadedModel:
+    version: str
+    weights_path: str
+    weights_digest: str
+    service: MLModelService
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        device: torch.device,
+        versions: dict[str, str],
+        active_version: str,
+        manifest_path: str | None = None,
+        poll_interval: timedelta = timedelta(seconds=10),
+    ):
+        """
+        Набор версий весов модели с горячей заменой активной версии
+
+        Новая версия загружается и прогревается в фоне, затем ссылка на неё
+        атомарно подменяется. Задача берёт текущую версию один раз в начале
+        и держит ссылку до конца, поэтому задачи в работе дообрабатываются
+        старой версией, а её память освобождается после их завершения.
+        """
+        self._device = device
+        self._versions = dict(versions)
+        self._active_version = active_version
+        self._manifest_path = manifest_path
+        self._manifest_mtime: float | None = None
+        self._poll_interval = poll_interval.total_seconds()
+        self._current: LoadedModel | None = None
+        self._lock = asyncio.Lock()
+        self._watcher: asyncio.Task[None] | None = None
+
+    @classmethod
+    def from_settings(cls, device: torch.device) -> "ModelRegistry":
+        conf = settings.ml_model
+        return cls(
+            device=device,
+            versions=conf.versions or {conf.active_version: conf.ml_model_path},
+            active_version=conf.active_version,
+            manifest_path=conf.registry_manifest_path,
+            poll_interval=conf.registry_poll_interval,
+        )
+
+    def current(self) -> LoadedModel:
+        if self._current is None:
+            raise RuntimeError("Model registry has no active version, call start() first")
+        return self._current
+
+    @property
+    def versions(self) -> dict[str, str]:
+        return dict(self._versions)
+
+    async def start(self) -> LoadedModel:
+        if self._manifest_path is not None:
+            await asyncio.to_thread(self._read_manifest, self._manifest_path)
+        loaded = await self.activate(self._active_version)
+        if self._manifest_path is not None:
+            self._watcher = asyncio.create_task(self._watch(self._manifest_path), name="model-registry-watch")
+        return loaded
+
+    async def activate(self, version: str) -> LoadedModel:
+        if version not in self._versions:
+            raise KeyError(f"Unknown model version {version!r}, known: {sorted(self._versions)}")
+        weights_path = self._versions[version]
+
+        async with self._lock:
+            digest = await asyncio.to_thread(weights_digest, weights_path)
+            current = self._current
+            # Та же версия с тем же путём, но новыми весами загружается заново
+            identity = (version, weights_path, digest)
+            if current is not None and (current.version, current.weights_path, current.weights_digest) == identity:
+                return current
+
+            service = await asyncio.to_thread(MLModelService.build, weights_path, self._device)
+            await asyncio.to_thread(service.warm_up)
+            loaded = LoadedModel(version=version, weights_path=weights_path, weights_digest=digest, service=service)
+            self._current = loaded
+            self._active_version = version
+
+        logger.info(
+            "model.version.activated",
+            extra={
+                "version": version,
+                "path": weights_path,
+                "previous": current.version if current is not None else None,
+            },
+        )
+        return loaded
+
+    async def close(self) -> None:
+        if self._watcher is None:
+            return
+        self._watcher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._watcher
+        self._watcher = None
+
+    async def _watch(self, manifest_path: str) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                if await asyncio.to_thread(self._read_manifest, manifest_path):
+                    await self.activate(self._active_version)
+            except Exception:
+                # Битый манифест или веса не должны ронять воркер, продолжаем на текущей версии
+                logger.exception("model.registry.reload.failed", extra={"path": manifest_path})
+
+    def _read_manifest(self, manifest_path: str) -> bool:
+        """Перечитывает манифест, если он появился или изменился с прошлого раза"""
+        try:
+            mtime = os.stat(manifest_path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._manifest_mtime:
+            return False
+        # Ошибочный манифест разбирается один раз, следующая попытка после его исправления
+        self._manifest_mtime = mtime
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        versions = {**self._versions, **manifest.get("versions", {})}
+        active_version = manifest.get("active", self._active_version)
+        if active_version not in versions:
+            raise KeyError(f"Manifest activates unknown model version {active_version!r}")
+
+        self._versions = versions
+        self._active_version = active_version
+        return True
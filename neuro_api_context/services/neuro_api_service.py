@@ -1,56 +1,172 @@
+import functools
 import logging
 import uuid
 from dataclasses import dataclass
+from pathlib import Path
 
-import torch
+import numpy as np
 
 from backend_context.persistent.pg.api import ImageProcessing
-from neuro_api_context.repositories.db_repository import DBRepository
+from base.infrastructure.executor.pool import BoundedExecutor
+from base.settings import ModelPrecision, settings
 from neuro_api_context.repositories.s3_repository import S3Repository
 from neuro_api_context.services.image_processing_service import ImageProcessor
-from neuro_api_context.services.ml_evaluator import MLModelService
+from neuro_api_context.services.inference_batcher import InferenceBatcher
+from neuro_api_context.services.model_registry import LoadedModel, ModelRegistry
+from neuro_api_context.services.result_cache import ResultCache, etag_result_cache_key, result_cache_key
+from neuro_api_context.services.streaming_scene import StreamingScene
+from neuro_api_context.services.task_events import TaskEventPublisher
+from neuro_api_context.services.task_status_writer import TaskStatusWriter
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
+class PreparedTask:
+    task_id: uuid.UUID
+    loaded: LoadedModel
+    # Нормализованный буфер из пула или входы, читаемые окнами из хранилища
+    scene: np.ndarray | StreamingScene
+    cache_key: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class PredictedTask:
+    task_id: uuid.UUID
+    output: np.ndarray
+    cache_key: str | None
+
+
 @dataclass(frozen=True, slots=True)
 class NeuroApiService:
     _s3_repository: S3Repository
-    _db_repository: DBRepository
+    _status_writer: TaskStatusWriter
     _image_processor: ImageProcessor
-    _ml_model_service: MLModelService
+    _inference_batcher: InferenceBatcher
+    _model_registry: ModelRegistry
+    _codec_executor: BoundedExecutor
+    _result_cache: ResultCache | None = None
+    # Конфигурация GDAL для чтения входов окнами из хранилища, None - входы скачиваются целиком
+    _gdal_options: dict[str, str] | None = None
+    _task_events: TaskEventPublisher | None = None
 
     async def process_task(self, task_id: uuid.UUID) -> None:
-        await self._db_repository.update_task_status(task_id=task_id, new_status=ImageProcessing.PROCESSING)
-        input_tensor = await self._download_and_preprocess_files(task_id=task_id)
-        result_image = await self._process_and_inverse_transform_images(
-            task_id=task_id,
-            input_tensor=input_tensor,
+        """Все стадии задачи подряд, воркер выполняет их конвейером TaskPipeline"""
+        prepared = await self.prepare_task(task_id)
+        if prepared is not None:
+            await self.finish_task(await self.predict_task(prepared))
+
+    async def prepare_task(self, task_id: uuid.UUID) -> PreparedTask | None:
+        """Стадия загрузки и декодирования входов, None - результат восстановлен из кэша и задача готова"""
+        # Задача до конца обрабатывается версией модели, активной на момент её старта
+        loaded = self._model_registry.current()
+        await self._status_writer.update(
+            task_id=task_id, new_status=ImageProcessing.PROCESSING, model_version=loaded.version
         )
-        await self._s3_repository.upload_result(task_id=task_id, result_content=result_image)
-        await self._db_repository.update_task_status(task_id=task_id, new_status=ImageProcessing.READY)
+        if self._gdal_options is None:
+            prepared = await self._prepare_downloaded(task_id=task_id, loaded=loaded)
+        else:
+            prepared = await self._prepare_streamed(task_id=task_id, loaded=loaded, gdal_options=self._gdal_options)
+        if prepared is None:
+            await self._status_writer.update(task_id=task_id, new_status=ImageProcessing.READY)
+        return prepared
 
-    async def _preprocessing_images(self, optical_image: bytes, sar_image: bytes) -> torch.Tensor:
-        return self._image_processor.preprocess(optical_image, sar_image)
+    async def predict_task(self, prepared: PreparedTask) -> PredictedTask:
+        """Стадия инференса, после неё буфер сцены возвращается в пул, а входы в хранилище закрываются"""
+        scene = prepared.scene
+        extract_fn = None
+        if isinstance(scene, StreamingScene):
+            extract_fn = functools.partial(self._codec_executor.run, prepared.loaded.service.tiler.extract, scene)
+        on_progress = None
+        if self._task_events is not None:
+            on_progress = functools.partial(self._task_events.progress, prepared.task_id)
+        try:
+            output = await self._inference_batcher.predict_scene(
+                scene, prepared.loaded.service, extract_fn=extract_fn, on_progress=on_progress
+            )
+        except Exception as e:
+            logger.exception("Ошибка обработки изображений", extra={"task_id": prepared.task_id, "error": str(e)})
+            raise
+        finally:
+            await self._release_scene(scene)
+        return PredictedTask(task_id=prepared.task_id, output=output, cache_key=prepared.cache_key)
 
-    async def _download_and_preprocess_files(self, task_id: uuid.UUID) -> torch.Tensor:
-        optical_image, sar_image = await self._s3_repository.download_images(task_id=task_id)
-        return await self._preprocessing_images(optical_image=optical_image, sar_image=sar_image)
+    async def release_task(self, prepared: PreparedTask) -> None:
+        """Освобождение сцены подготовленной задачи, которая не пойдёт в predict_task"""
+        await self._release_scene(prepared.scene)
 
-    async def _process_and_inverse_transform_images(
-        self,
-        task_id: uuid.UUID,
-        input_tensor: torch.Tensor,
-    ) -> bytes:
+    async def finish_task(self, predicted: PredictedTask) -> None:
+        """Стадия кодирования результата, выгрузки в хранилище и перевода задачи в READY"""
+        result_image = await self._codec_executor.run(self._image_processor.postprocess, predicted.output)
+        logger.info(
+            "image.processed",
+            extra={
+                "task_id": predicted.task_id,
+                "height": predicted.output.shape[1],
+                "width": predicted.output.shape[2],
+            },
+        )
+        await self._upload_result(task_id=predicted.task_id, result_image=result_image, cache_key=predicted.cache_key)
+        await self._status_writer.update(task_id=predicted.task_id, new_status=ImageProcessing.READY)
+
+    async def _prepare_downloaded(self, task_id: uuid.UUID, loaded: LoadedModel) -> PreparedTask | None:
+        optical_image, sar_image = await self._s3_repository.download_images(task_id=task_id)
         try:
-            output_tensor = self._ml_model_service.predict(input_tensor=input_tensor)
+            cache_key = None
+            if self._result_cache is not None:
+                cache_key = await self._codec_executor.run(
+                    result_cache_key, optical_image, sar_image, self._model_tag(loaded)
+                )
+                if await self._result_cache.restore(cache_key=cache_key, task_id=task_id):
+                    return None
 
-            result_image_bytes = self._image_processor.postprocess(output_tensor)
+            scene = await self._prepare_scene(optical_image=optical_image, sar_image=sar_image)
+        finally:
+            # Файлы входного кэша больше не читаются, их можно вытеснять
+            await self._s3_repository.release_images(optical_image, sar_image)
+        return PreparedTask(task_id=task_id, loaded=loaded, scene=scene, cache_key=cache_key)
 
-            logger.info("image.processed", extra={"task_id": task_id})
+    async def _prepare_streamed(
+        self, task_id: uuid.UUID, loaded: LoadedModel, gdal_options: dict[str, str]
+    ) -> PreparedTask | None:
+        """Открываются только заголовки входов, окна читаются из хранилища по мере инференса"""
+        cache_key = None
+        if self._result_cache is not None:
+            optical_etag, sar_etag = await self._s3_repository.head_images(task_id=task_id)
+            cache_key = etag_result_cache_key(optical_etag, sar_etag, self._model_tag(loaded))
+            if await self._result_cache.restore(cache_key=cache_key, task_id=task_id):
+                return None
 
-        except Exception as e:
-            logger.exception("Ошибка обработки изображений", extra={"task_id": task_id, "error": str(e)})
-            raise
+        optical_path, sar_path = self._s3_repository.input_paths(task_id=task_id)
+        scene = await self._codec_executor.run(
+            StreamingScene, self._image_processor, optical_path, sar_path, gdal_options
+        )
+        return PreparedTask(task_id=task_id, loaded=loaded, scene=scene, cache_key=cache_key)
+
+    async def _release_scene(self, scene: np.ndarray | StreamingScene) -> None:
+        if isinstance(scene, StreamingScene):
+            await self._codec_executor.run(scene.close)
         else:
-            return result_image_bytes
+            self._image_processor.release(scene)
+
+    async def _upload_result(self, task_id: uuid.UUID, result_image: bytes, cache_key: str | None) -> None:
+        await self._s3_repository.upload_result(task_id=task_id, result_content=result_image)
+        if self._result_cache is not None and cache_key is not None:
+            await self._result_cache.store(cache_key=cache_key, task_id=task_id)
+
+    def _model_tag(self, loaded: LoadedModel) -> str:
+        """Всё, что при тех же входах меняет байты result.tif, входит в ключ кэша результатов"""
+        conf = settings.ml_model
+        return ":".join(
+            (
+                loaded.version,
+                loaded.weights_digest,
+                ModelPrecision(conf.precision).value,
+                f"tile={conf.tile_size}/{conf.tile_overlap}",
+                f"channels_last={conf.channels_last}",
+                self._image_processor.output_profile.model_dump_json(),
+            )
+        )
+
+    async def _prepare_scene(self, optical_image: bytes | Path, sar_image: bytes | Path) -> np.ndarray:
+        return await self._codec_executor.run(self._image_processor.prepare, optical_image, sar_image)
@@ -0,0 +1,115 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from neuro_api_context.repositories.s3_repository import S3Repository
+
+logger = logging.getLogger(__name__)
+
+
+def result_cache_key(optical_image: bytes | Path, sar_image: bytes | Path, model_version: str) -> str:
+    """sha256 обоих входов и версии модели, длины разделяют поля, чтобы границы не сдвигались"""
+    digest = hashlib.sha256()
+    for part in (optical_image, sar_image, model_version.encode()):
+        if isinstance(part, Path):
+            _update_from_file(digest, part)
+        else:
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+    return f"{digest.hexdigest()}.tif"
+
+
+def _update_from_file(digest: "hashlib._Hash", path: Path) -> None:
+    # Файл из локального кэша входов хэшируется через отображение в память, без чтения в bytes
+    with path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        digest.update(size.to_bytes(8, "big"))
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+
+
+def etag_result_cache_key(optical_etag: str, sar_etag: str, model_version: str) -> str:
+    """Ключ для входов, которые читаются из хранилища окнами и целиком не скачиваются"""
+    return result_cache_key(f"etag:{optical_etag}".encode(), f"etag:{sar_etag}".encode(), model_version)
+
+
+class ResultCache:
+    def __init__(
+        self,
+        s3_repository: S3Repository,
+        max_age: timedelta,
+        max_size_bytes: int,
+        sweep_interval: timedelta,
+    ):
+        """
+        Кэш результатов в S3 с ключом по содержимому входов
+
+        Повторная отправка тех же снимков обходится серверным копированием
+        готового result.tif вместо инференса. Периодическая уборка удаляет
+        записи старше max_age, затем самые старые, пока суммарный размер
+        больше max_size_bytes.
+        """
+        self._s3_repository = s3_repository
+        self._max_age = max_age
+        self._max_size_bytes = max_size_bytes
+        self._sweep_interval = sweep_interval.total_seconds()
+        self._sweeper: asyncio.Task[None] | None = None
+
+    async def restore(self, cache_key: str, task_id: uuid.UUID) -> bool:
+        hit = await self._s3_repository.restore_cached_result(cache_key=cache_key, task_id=task_id)
+        logger.info("result.cache.hit" if hit else "result.cache.miss", extra={"task_id": task_id, "key": cache_key})
+        return hit
+
+    async def store(self, cache_key: str, task_id: uuid.UUID) -> None:
+        try:
+            await self._s3_repository.store_cached_result(cache_key=cache_key, task_id=task_id)
+        except Exception:
+            # Результат задачи уже загружен, без записи в кэше она всё равно успешна
+            logger.warning("result.cache.store.failed", extra={"task_id": task_id, "key": cache_key}, exc_info=True)
+
+    def start(self) -> None:
+        self._sweeper = asyncio.create_task(self._sweep_periodically(), name="result-cache-sweeper")
+
+    async def close(self) -> None:
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._sweeper
+        self._sweeper = None
+
+    async def sweep(self) -> int:
+        objects = await self._s3_repository.list_cached_results()
+        expires_before = datetime.now(timezone.utc) - self._max_age
+
+        # От новых к старым: всё, что не влезло в бюджет размера, старше оставленного и удаляется
+        expired, total_size, over_budget = [], 0, False
+        for obj in sorted(objects, key=lambda o: o["LastModified"], reverse=True):
+            over_budget = over_budget or total_size + obj["Size"] > self._max_size_bytes
+            if over_budget or obj["LastModified"] < expires_before:
+                expired.append(obj["Key"])
+            else:
+                total_size += obj["Size"]
+
+        if expired:
+            await self._s3_repository.delete_objects(expired)
+        logger.info(
+            "result.cache.swept",
+            extra={"entries": len(objects), "evicted": len(expired), "size_bytes": total_size},
+        )
+        return len(expired)
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("result.cache.sweep.failed")
+            await asyncio.sleep(self._sweep_interval)
@@ -0,0 +1,67 @@
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from neuro_api_context.services.image_processing_service import ImageProcessor
+from neuro_api_context.services.tiled_inference import TileWindow
+
+if TYPE_CHECKING:
+    from rasterio.io import DatasetReader
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingScene:
+    def __init__(
+        self,
+        image_processor: ImageProcessor,
+        optical_path: str,
+        sar_path: str,
+        gdal_options: dict[str, str],
+    ):
+        """
+        Пара снимков, читаемая окнами прямо из хранилища
+
+        Открытие читает только заголовки GeoTIFF, каждое окно - диапазонными
+        запросами нужных блоков, поэтому память на входе пропорциональна тайлу,
+        а инференс первых тайлов начинается до того, как прочитан весь снимок.
+        Открытие, чтение и закрытие блокирующие, их вызывают в пуле потоков.
+        """
+        import rasterio
+
+        self._image_processor = image_processor
+        self._gdal_options = gdal_options
+        # Наборы данных GDAL не потокобезопасны, окна одной сцены читаются по очереди
+        self._lock = threading.Lock()
+        with rasterio.Env(**gdal_options):
+            self._s2: DatasetReader = rasterio.open(optical_path)
+            try:
+                self._s1: DatasetReader = rasterio.open(sar_path)
+            except BaseException:
+                self._s2.close()
+                raise
+        try:
+            self._height, self._width = image_processor.validate_pair(self._s2, self._s1)
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return 15, self._height, self._width
+
+    def read_window(self, window: TileWindow) -> np.ndarray:
+        import rasterio
+        from rasterio.windows import Window
+
+        out = np.empty((15, window.height, window.width), dtype=np.float32)
+        with self._lock, rasterio.Env(**self._gdal_options):
+            return self._image_processor.read_normalized(
+                self._s2, self._s1, out, window=Window(window.col, window.row, window.width, window.height)
+            )
+
+    def close(self) -> None:
+        self._s2.close()
+        self._s1.close()
@@ -0,0 +1,55 @@
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+
+from backend_context.persistent.pg.api import ImageProcessing
+from backend_context.schemas.api_schemas import TaskStatusEvent
+from neuro_api_context.repositories.db_repository import TaskStatusUpdate
+
+logger = logging.getLogger(__name__)
+
+
+class TaskEventPublisher:
+    def __init__(self, progress_interval: timedelta):
+        """
+        События задач для процессов API: записанные смены статусов и прогресс инференса
+
+        Прогресс одной задачи публикуется не чаще progress_interval, последняя пачка
+        тайлов отправляется всегда. Пока publish не привязан (брокер не подключён
+        или события выключены), события отбрасываются. Ошибка публикации не
+        влияет на задачу, статус в БД остаётся источником истины.
+        """
+        self._progress_interval = progress_interval.total_seconds()
+        self._publish: Callable[[list[TaskStatusEvent]], Awaitable[None]] | None = None
+        self._last_progress_at: dict[uuid.UUID, float] = {}
+
+    def bind(self, publish: Callable[[list[TaskStatusEvent]], Awaitable[None]]) -> None:
+        self._publish = publish
+
+    async def statuses_flushed(self, updates: list[TaskStatusUpdate]) -> None:
+        await self._send(
+            [
+                TaskStatusEvent(task_id=update.task_id, status=update.status, model_version=update.model_version)
+                for update in updates
+            ]
+        )
+
+    async def progress(self, task_id: uuid.UUID, done: int, total: int) -> None:
+        if done < total:
+            now = time.monotonic()
+            if now - self._last_progress_at.get(task_id, 0.0) < self._progress_interval:
+                return
+            self._last_progress_at[task_id] = now
+        else:
+            self._last_progress_at.pop(task_id, None)
+        await self._send([TaskStatusEvent(task_id=task_id, status=ImageProcessing.PROCESSING, progress=done / total)])
+
+    async def _send(self, events: list[TaskStatusEvent]) -> None:
+        if self._publish is None or not events:
+            return
+        try:
+            await self._publish(events)
+        except Exception:
+            logger.warning("task.events.publish.failed", extra={"events": len(events)}, exc_info=True)
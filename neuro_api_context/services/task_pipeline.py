@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+from neuro_api_context.services.neuro_api_service import NeuroApiService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class PipelineStage:
+    name: str
+    # Принимает результат предыдущей стадии, None завершает задачу досрочно
+    run: Callable[[Any], Awaitable[Any]]
+    workers: int
+    # Освобождает входное состояние стадии (буфер сцены, открытые файлы), если задача до неё не дошла
+    discard: Callable[[Any], Awaitable[None]] | None = None
+
+
+@dataclass(slots=True)
+class _PipelineItem:
+    task_id: uuid.UUID
+    future: asyncio.Future[None]
+    state: Any
+    started_at: float
+
+
+class TaskPipeline:
+    def __init__(self, stages: list[PipelineStage], queue_size: int):
+        """
+        Конвейер стадий задачи с ограниченными очередями между ними
+
+        Пока задача N в модели, задача N+1 скачивается и декодируется,
+        а N-1 кодируется и выгружается. Стадия, у которой заполнена очередь
+        следующей, ждёт, поэтому в работе одновременно не больше depth задач,
+        и столько же сообщений имеет смысл брать из очереди брокера.
+        """
+        self._stages = stages
+        self._queue_size = queue_size
+        self._queues: list[asyncio.Queue[_PipelineItem]] = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+        self._workers: list[asyncio.Task[None]] = []
+
+    @classmethod
+    def for_service(
+        cls,
+        service: NeuroApiService,
+        prepare_workers: int,
+        predict_workers: int,
+        finish_workers: int,
+        queue_size: int,
+    ) -> "TaskPipeline":
+        return cls(
+            stages=[
+                PipelineStage(name="prepare", run=service.prepare_task, workers=prepare_workers),
+                PipelineStage(
+                    name="predict", run=service.predict_task, workers=predict_workers, discard=service.release_task
+                ),
+                PipelineStage(name="finish", run=service.finish_task, workers=finish_workers),
+            ],
+            queue_size=queue_size,
+        )
+
+    @property
+    def depth(self) -> int:
+        """Сколько задач конвейер держит одновременно: в работе у стадий и в очередях перед ними"""
+        return sum(stage.workers for stage in self._stages) + self._queue_size * len(self._stages)
+
+    def start(self) -> None:
+        for index, stage in enumerate(self._stages):
+            for number in range(stage.workers):
+                self._workers.append(
+                    asyncio.create_task(self._run_stage(index), name=f"task-pipeline-{stage.name}-{number}")
+                )
+
+    async def submit(self, task_id: uuid.UUID) -> None:
+        """Ждёт, пока задача пройдёт все стадии, ошибка стадии пробрасывается вызывающему"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[0].put(
+            _PipelineItem(task_id=task_id, future=future, state=task_id, started_at=time.perf_counter())
+        )
+        await future
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await worker
+        self._workers.clear()
+
+    async def _run_stage(self, index: int) -> None:
+        stage = self._stages[index]
+        inbox = self._queues[index]
+        is_last = index == len(self._stages) - 1
+        while True:
+            item = await inbox.get()
+            # Обработчик сообщения отменён, например при остановке воркера
+            if item.future.done():
+                await self._discard(stage, item)
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                item.state = await stage.run(item.state)
+            except Exception as e:
+                if not item.future.done():
+                    item.future.set_exception(e)
+                continue
+            logger.debug(
+                "task.pipeline.stage.done",
+                extra={
+                    "task_id": item.task_id,
+                    "stage": stage.name,
+                    "stage_ms": (time.perf_counter() - started_at) * 1000,
+                },
+            )
+
+            if is_last or item.state is None:
+                logger.info(
+                    "task.pipeline.done",
+                    extra={"task_id": item.task_id, "total_ms": (time.perf_counter() - item.started_at) * 1000},
+                )
+                if not item.future.done():
+                    item.future.set_result(None)
+            else:
+                # Ожидание места в очереди следующей стадии ограничивает число задач в работе
+                await self._queues[index + 1].put(item)
+
+    @staticmethod
+    async def _discard(stage: PipelineStage, item: _PipelineItem) -> None:
+        if stage.discard is None:
+            return
+        try:
+            await stage.discard(item.state)
+        except Exception:
+            logger.warning(
+                "task.pipeline.discard.failed", extra={"task_id": item.task_id, "stage": stage.name}, exc_info=True
+            )
@@ -0,0 +1,255 @@
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from backend_context.persistent.pg.api import STATUS_RANK, ImageProcessing
+from neuro_api_context.repositories.db_repository import DBRepository, TaskStatusUpdate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _StatusItem:
+    update: TaskStatusUpdate
+    future: asyncio.Future[bool]
+
+
+@dataclass(slots=True)
+class _Coalesced:
+    update: TaskStatusUpdate
+    futures: list[asyncio.Future[bool]] = field(default_factory=list)
+
+    def set_result(self, updated: bool) -> None:
+        for future in self.futures:
+            if not future.done():
+                future.set_result(updated)
+
+    def set_exception(self, exc: Exception) -> None:
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(exc)
+
+
+class TaskStatusWriter:
+    def __init__(
+        self,
+        db_repository: DBRepository,
+        max_batch_size: int,
+        flush_interval: timedelta,
+        max_attempts: int = 5,
+        retry_delay: timedelta = timedelta(milliseconds=100),
+        max_retry_delay: timedelta = timedelta(seconds=2),
+        stats_interval: timedelta = timedelta(minutes=1),
+    ):
+        """
+        Объединяет смены статусов задач в один UPDATE на пачку
+
+        Смены копятся не дольше flush_interval с момента первой или до max_batch_size
+        задач. Несколько смен одной задачи в пачке сливаются в последнюю по рангу,
+        READY не заменяется PROCESSING. Пачки пишутся строго по очереди, поэтому READY
+        не обгоняется более ранним PROCESSING из предыдущей пачки. update возвращает
+        управление после коммита пачки, READY подтверждается в БД до ack сообщения.
+        Неудачная запись повторяется до max_attempts раз с удваивающейся паузой,
+        смены статусов, пришедшие за это время, сливаются в ту же пачку.
+        Размеры пачек и время записи логируются не чаще раза в stats_interval.
+        """
+        if max_batch_size <= 0:
+            raise ValueError(f"Max batch size must be positive, got {max_batch_size}")
+        if max_attempts <= 0:
+            raise ValueError(f"Max attempts must be positive, got {max_attempts}")
+
+        self._db_repository = db_repository
+        self._max_batch_size = max_batch_size
+        self._flush_interval = flush_interval.total_seconds()
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay.total_seconds()
+        self._max_retry_delay = max_retry_delay.total_seconds()
+        self._stats_interval = stats_interval.total_seconds()
+        self._stats_logged_at = time.monotonic()
+        self._queue: asyncio.Queue[_StatusItem | None] = asyncio.Queue()
+        self._worker: asyncio.Task[None] | None = None
+        self._closing = False
+        self._listeners: list[Callable[[list[TaskStatusUpdate]], Awaitable[None]]] = []
+        self.flushes = 0
+        self.updates = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.flushed_tasks = 0
+        self.last_batch_size = 0
+        self.total_flush_ms = 0.0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    async def update(
+        self,
+        task_id: uuid.UUID,
+        new_status: ImageProcessing,
+        model_version: str | None = None,
+    ) -> bool:
+        if self._closing:
+            raise RuntimeError("Task status writer is closed")
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="task-status-writer")
+
+        item = _StatusItem(
+            update=TaskStatusUpdate(task_id=task_id, status=new_status, model_version=model_version),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._queue.put_nowait(item)
+        return await item.future
+
+    def add_listener(self, listener: Callable[[list[TaskStatusUpdate]], Awaitable[None]]) -> None:
+        """listener получает записанные смены статусов каждой пачки в порядке записи"""
+        self._listeners.append(listener)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "flushes": self.flushes,
+            "updates": self.updates,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": self.flushed_tasks / self.flushes if self.flushes else 0.0,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+            "max_flush_ms": self.max_flush_ms,
+        }
+
+    async def close(self) -> None:
+        """Дописывает накопленные смены статусов и останавливает запись"""
+        self._closing = True
+        if self._worker is None:
+            return
+        self._queue.put_nowait(None)
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._worker
+        self._worker = None
+        logger.info("task.status.writer.closed", extra=self.stats())
+
+    async def _run(self) -> None:
+        while True:
+            batch, closing = await self._collect()
+            if batch:
+                closing = await self._flush(batch) or closing
+            if closing:
+                return
+
+    async def _collect(self) -> tuple[dict[uuid.UUID, _Coalesced], bool]:
+        first = await self._queue.get()
+        if first is None:
+            return {}, True
+        batch: dict[uuid.UUID, _Coalesced] = {}
+        self._merge(batch, first)
+        deadline = asyncio.get_running_loop().time() + self._flush_interval
+
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            self._merge(batch, item)
+
+        return batch, False
+
+    def _merge(self, batch: dict[uuid.UUID, _Coalesced], item: _StatusItem) -> None:
+        self.updates += 1
+        pending = batch.get(item.update.task_id)
+        if pending is None:
+            batch[item.update.task_id] = _Coalesced(update=item.update, futures=[item.future])
+            return
+
+        self.coalesced += 1
+        pending.futures.append(item.future)
+        current, new = pending.update, item.update
+        if STATUS_RANK[new.status] >= STATUS_RANK[current.status]:
+            pending.update = TaskStatusUpdate(
+                task_id=new.task_id,
+                status=new.status,
+                model_version=new.model_version or current.model_version,
+            )
+
+    async def _flush(self, batch: dict[uuid.UUID, _Coalesced]) -> bool:
+        """Запись пачки, возвращает True, если во время повторов пришёл сигнал закрытия"""
+        started_at = time.perf_counter()
+        updated, closing = await self._write(batch)
+        if updated is None:
+            return closing
+
+        self._record_flush(len(batch), (time.perf_counter() - started_at) * 1000)
+        logger.debug(
+            "task.status.flushed",
+            extra={"batch_size": len(batch), "updated": len(updated), "flush_ms": self.last_flush_ms},
+        )
+
+        for task_id, pending in batch.items():
+            if task_id not in updated:
+                logger.warning(
+                    "task.status.not.updated", extra={"task_id": task_id, "status": pending.update.status.value}
+                )
+            pending.set_result(task_id in updated)
+        await self._notify([pending.update for task_id, pending in batch.items() if task_id in updated])
+        return closing
+
+    def _record_flush(self, batch_size: int, flush_ms: float) -> None:
+        self.flushes += 1
+        self.flushed_tasks += batch_size
+        self.last_batch_size = batch_size
+        self.total_flush_ms += flush_ms
+        self.last_flush_ms = flush_ms
+        self.max_flush_ms = max(self.max_flush_ms, flush_ms)
+
+        now = time.monotonic()
+        if now - self._stats_logged_at >= self._stats_interval:
+            self._stats_logged_at = now
+            logger.info("task.status.writer.stats", extra=self.stats())
+
+    async def _write(self, batch: dict[uuid.UUID, _Coalesced]) -> tuple[set[uuid.UUID] | None, bool]:
+        closing = False
+        delay = self._retry_delay
+        attempt = 1
+        while True:
+            try:
+                return await self._db_repository.update_task_statuses([p.update for p in batch.values()]), closing
+            except Exception as e:
+                if attempt >= self._max_attempts:
+                    logger.exception("task.status.flush.failed", extra={"batch_size": len(batch), "attempts": attempt})
+                    for pending in batch.values():
+                        pending.set_exception(e)
+                    return None, closing
+                logger.warning(
+                    "task.status.flush.retry", extra={"batch_size": len(batch), "attempt": attempt}, exc_info=True
+                )
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_retry_delay)
+            # Новые смены тех же задач сливаются с неудавшимися, READY не теряется за PROCESSING
+            closing = self._drain(batch) or closing
+
+    def _drain(self, batch: dict[uuid.UUID, _Coalesced]) -> bool:
+        while not self._queue.empty() and len(batch) < self._max_batch_size:
+            item = self._queue.get_nowait()
+            if item is None:
+                return True
+            self._merge(batch, item)
+        return False
+
+    async def _notify(self, flushed: list[TaskStatusUpdate]) -> None:
+        if not flushed:
+            return
+        for listener in self._listeners:
+            try:
+                await listener(flushed)
+            except Exception:
+                # Статусы уже в БД, слушатели только ускоряют их доставку
+                logger.warning("task.status.listener.failed", extra={"batch_size": len(flushed)}, exc_info=True)
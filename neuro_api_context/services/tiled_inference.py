@@ -0,0 +1,207 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass
+from typing import Protocol
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# GeneratorUNet понижает разрешение 4 раза с шагом 2
+MODEL_STRIDE = 16
+
+
+@dataclass(frozen=True, slots=True)
+class TileWindow:
+    row: int
+    col: int
+    height: int
+    width: int
+
+
+class SceneSource(Protocol):
+    """Сцена, которая читается окнами по мере надобности, а не лежит целиком в памяти"""
+
+    @property
+    def shape(self) -> tuple[int, int, int]: ...
+
+    def read_window(self, window: TileWindow) -> np.ndarray: ...
+
+
+class TiledInference:
+    def __init__(self, tile_size: int, overlap: int, batch_size: int = 1, channels_last: bool = False):
+        """
+        Инференс полноразмерной сцены по перекрывающимся тайлам
+
+        Крайние тайлы прижимаются к границе сцены, сцены меньше тайла
+        дополняются отражением до размера, кратного 16. Перекрытия
+        смешиваются с весами, плавно спадающими к краям тайла, результат
+        собирается в заранее выделенный массив, поэтому пиковая память
+        модели определяется размером тайла, а не сцены.
+
+        Параметры:
+        - tile_size: сторона тайла в пикселях, кратная 16
+        - overlap: ширина перекрытия соседних тайлов в пикселях
+        - batch_size: количество тайлов в одном прямом проходе
+        - channels_last: тайлы (N, C, H, W) лежат в памяти как NHWC, как ждёт модель в channels_last
+        """
+        if tile_size <= 0 or tile_size % MODEL_STRIDE != 0:
+            raise ValueError(f"Tile size must be a positive multiple of {MODEL_STRIDE}, got {tile_size}")
+        if not 0 <= overlap < tile_size:
+            raise ValueError(f"Tile overlap must be in [0, {tile_size}), got {overlap}")
+        if batch_size <= 0:
+            raise ValueError(f"Tile batch size must be positive, got {batch_size}")
+
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.channels_last = channels_last
+        self._stride = tile_size - overlap
+        self._feathers: dict[tuple[int, int], np.ndarray] = {}
+
+    def windows(self, height: int, width: int) -> list[TileWindow]:
+        rows = self._axis_starts(height)
+        cols = self._axis_starts(width)
+        tile_height, tile_width = min(self.tile_size, height), min(self.tile_size, width)
+        return [TileWindow(row=r, col=c, height=tile_height, width=tile_width) for r in rows for c in cols]
+
+    def predict(
+        self,
+        scene: np.ndarray,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        out_channels: int,
+    ) -> np.ndarray:
+        """Прогон сцены (C, H, W) через predict_fn, возвращает (out_channels, H, W) float32"""
+        _, height, width = scene.shape
+        output, weights = self._allocate(out_channels, height, width)
+        for batch in self._batches(self.windows(height, width)):
+            self.accumulate(output, weights, batch, predict_fn(self.extract(scene, batch)))
+        return self.finalize(output, weights)
+
+    async def apredict(
+        self,
+        scene: np.ndarray | SceneSource,
+        predict_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        out_channels: int,
+        extract_fn: Callable[[list[TileWindow]], Awaitable[np.ndarray]] | None = None,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> np.ndarray:
+        """
+        Асинхронный вариант predict, тайлы отдаются в predict_fn по одной пачке за раз
+
+        extract_fn читает тайлы вне цикла событий (например, SceneSource из хранилища),
+        следующая пачка читается, пока модель считает текущую.
+        on_progress получает число готовых и всех пачек после каждой пачки.
+        """
+        _, height, width = scene.shape
+        output, weights = self._allocate(out_channels, height, width)
+        batches = list(self._batches(self.windows(height, width)))
+        report = on_progress or _ignore_progress
+        if extract_fn is None:
+            for i, batch in enumerate(batches):
+                self.accumulate(output, weights, batch, await predict_fn(self.extract(scene, batch)))
+                await report(i + 1, len(batches))
+            return self.finalize(output, weights)
+
+        pending = asyncio.ensure_future(extract_fn(batches[0]))
+        try:
+            for i, batch in enumerate(batches):
+                tiles = await pending
+                if i + 1 < len(batches):
+                    pending = asyncio.ensure_future(extract_fn(batches[i + 1]))
+                self.accumulate(output, weights, batch, await predict_fn(tiles))
+                await report(i + 1, len(batches))
+        finally:
+            if not pending.done():
+                pending.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await pending
+        return self.finalize(output, weights)
+
+    def extract(self, scene: np.ndarray | SceneSource, windows: list[TileWindow]) -> np.ndarray:
+        channels = scene.shape[0]
+        padded_height, padded_width = _pad_to_stride(windows[0].height), _pad_to_stride(windows[0].width)
+        tiles = self._allocate_tiles(len(windows), channels, padded_height, padded_width)
+        for tile, window in zip(tiles, windows, strict=True):
+            if isinstance(scene, np.ndarray):
+                source = scene[:, window.row : window.row + window.height, window.col : window.col + window.width]
+            else:
+                source = scene.read_window(window)
+            if (padded_height, padded_width) == (window.height, window.width):
+                tile[...] = source
+                continue
+            pad = ((0, 0), (0, padded_height - window.height), (0, padded_width - window.width))
+            mode = "reflect" if min(window.height, window.width) > 1 else "edge"
+            tile[...] = np.pad(source, pad, mode=mode)
+        return tiles
+
+    def concatenate(self, chunks: list[np.ndarray]) -> np.ndarray:
+        """Склейка пачек тайлов с сохранением раскладки в памяти"""
+        tiles = self._allocate_tiles(sum(len(chunk) for chunk in chunks), *chunks[0].shape[1:])
+        offset = 0
+        for chunk in chunks:
+            tiles[offset : offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return tiles
+
+    def accumulate(
+        self,
+        output: np.ndarray,
+        weights: np.ndarray,
+        windows: list[TileWindow],
+        predictions: np.ndarray,
+    ) -> None:
+        for window, prediction in zip(windows, predictions, strict=True):
+            feather = self._feather(window.height, window.width)
+            rows = slice(window.row, window.row + window.height)
+            cols = slice(window.col, window.col + window.width)
+            output[:, rows, cols] += prediction[:, : window.height, : window.width] * feather
+            weights[rows, cols] += feather
+
+    def finalize(self, output: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        output /= weights
+        return output
+
+    def _allocate_tiles(self, count: int, channels: int, height: int, width: int) -> np.ndarray:
+        if self.channels_last:
+            return np.empty((count, height, width, channels), dtype=np.float32).transpose(0, 3, 1, 2)
+        return np.empty((count, channels, height, width), dtype=np.float32)
+
+    def _allocate(self, out_channels: int, height: int, width: int) -> tuple[np.ndarray, np.ndarray]:
+        output = np.zeros((out_channels, height, width), dtype=np.float32)
+        weights = np.zeros((height, width), dtype=np.float32)
+        return output, weights
+
+    def _batches(self, windows: list[TileWindow]) -> Iterator[list[TileWindow]]:
+        for start in range(0, len(windows), self.batch_size):
+            yield windows[start : start + self.batch_size]
+
+    def _axis_starts(self, size: int) -> list[int]:
+        if size <= self.tile_size:
+            return [0]
+        starts = list(range(0, size - self.tile_size, self._stride))
+        starts.append(size - self.tile_size)
+        return starts
+
+    def _feather(self, height: int, width: int) -> np.ndarray:
+        feather = self._feathers.get((height, width))
+        if feather is None:
+            feather = np.outer(self._ramp(height), self._ramp(width)).astype(np.float32)
+            self._feathers[(height, width)] = feather
+        return feather
+
+    def _ramp(self, size: int) -> np.ndarray:
+        # Линейный спад весов на ширине перекрытия, веса строго положительны
+        positions = np.arange(size, dtype=np.float32)
+        distance = np.minimum(positions + 1, size - positions)
+        return np.minimum(distance, self.overlap + 1) / (self.overlap + 1)
+
+
+def _pad_to_stride(size: int) -> int:
+    return -(-size // MODEL_STRIDE) * MODEL_STRIDE
+
+
+async def _ignore_progress(_done: int, _total: int) -> None:
+    return None
@@ -0,0 +1,280 @@
+"""
+Бенчмарк этапов пайплайна воркера: декодирование, нормализация, инференс, постобработка
+
+Входы синтетические (13-канальный S2 uint16 и 2-канальный S1 float32 в дБ с NaN),
+поэтому запускается на любой CPU машине без доступа к S3 и весам модели.
+Результаты сохраняются в JSON для сравнения прогонов между собой:
+
+    make bench BENCH_OUTPUT=bench/before.json
+    make bench BENCH_OUTPUT=bench/after.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import rasterio
+import torch
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+
+from base.settings import ModelPrecision, OutputProfile, RasterCompression, settings
+from neuro_api_context.services.image_processing_service import ImageProcessor
+from neuro_api_context.services.ml_evaluator import OUT_CHANNELS, MLModelService
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark ImageProcessor and GeneratorUNet stages")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024], help="Square scene sides")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--tile-size", type=int, default=settings.ml_model.tile_size)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--weights", default=None, help="Model weights (optimized as in the worker), random eager model when omitted"
+    )
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"))
+    return parser.parse_args()
+
+
+def synthetic_geotiff(data: np.ndarray) -> bytes:
+    with MemoryFile() as memfile:
+        with memfile.open(
+            driver="GTiff",
+            height=data.shape[1],
+            width=data.shape[2],
+            count=data.shape[0],
+            dtype=data.dtype,
+            transform=from_origin(0, 0, 10, 10),
+        ) as dst:
+            dst.write(data)
+        return memfile.read()
+
+
+def synthetic_pair(size: int, seed: int = 0) -> tuple[bytes, bytes]:
+    rng = np.random.default_rng(seed)
+    s2 = rng.integers(0, 4000, (13, size, size), dtype=np.uint16)
+    s1 = rng.uniform(-30.0, 1.0, (2, size, size)).astype(np.float32)
+    # Пропуски в радарном канале, как на краях реальных сцен
+    s1[:, : size // 32, : size // 32] = np.nan
+    return synthetic_geotiff(s2), synthetic_geotiff(s1)
+
+
+def measure(fn: Callable[[], Any], repeats: int) -> dict[str, float]:
+    """Один прогрев, затем repeats замеров в миллисекундах"""
+    fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "mean_ms": statistics.fmean(samples),
+        "repeats": repeats,
+    }
+
+
+def legacy_prepare(processor: ImageProcessor, s2_bytes: bytes, s1_bytes: bytes) -> np.ndarray:
+    """Прежний путь prepare: astype, цикл по каналам с nanmean, временные массивы и concatenate"""
+
+    def handle_nan(data: np.ndarray) -> np.ndarray:
+        data = data.astype(np.float32)
+        for i in range(data.shape[0]):
+            channel = data[i]
+            if np.isnan(channel).any():
+                nan_mask = np.isnan(channel)
+                channel[nan_mask] = np.nanmean(channel)
+        return data
+
+    s2 = handle_nan(processor._load_and_validate_image(s2_bytes, 13))
+    s1 = handle_nan(processor._load_and_validate_image(s1_bytes, 2))
+    s2_norm = np.clip((s2 / processor.s2_max_reflectance) * 2.0 - 1.0, -1.0, 1.0)
+    s1_clipped = np.clip(s1, processor.s1_clip_min, processor.s1_clip_max)
+    s1_norm = np.clip(((s1_clipped - processor.s1_clip_min) / processor.s1_denominator) * 2.0 - 1.0, -1.0, 1.0)
+    return np.concatenate([s2_norm, s1_norm], axis=0)
+
+
+def _pooled_prepare(processor: ImageProcessor, s2_bytes: bytes, s1_bytes: bytes) -> None:
+    # Как в воркере: буфер возвращается в пул после инференса
+    processor.release(processor.prepare(s2_bytes, s1_bytes))
+
+
+def bench_processing(processor: ImageProcessor, size: int, repeats: int) -> list[dict[str, Any]]:
+    s2_bytes, s1_bytes = synthetic_pair(size)
+    s2 = processor._load_and_validate_image(s2_bytes, 13).astype(np.float32)
+    s1 = processor._load_and_validate_image(s1_bytes, 2)
+    output = np.random.default_rng(1).uniform(-1.0, 1.0, (OUT_CHANNELS, size, size)).astype(np.float32)
+
+    reference = legacy_prepare(processor, s2_bytes, s1_bytes)
+    fused = processor.prepare(s2_bytes, s1_bytes)
+    max_abs_diff = float(np.nanmax(np.abs(reference - fused)))
+    processor.release(fused)
+
+    # Нормализация работает на месте, поэтому каждый замер начинается с копии исходных каналов
+    s2_work, s1_work = np.empty_like(s2), np.empty_like(s1)
+    stages: dict[str, Callable[[], Any]] = {
+        "load_s2": lambda: processor._load_and_validate_image(s2_bytes, 13),
+        "load_s1": lambda: processor._load_and_validate_image(s1_bytes, 2),
+        "normalize_s2": lambda: processor._normalize_s2(processor._handle_nan(_copy(s2, s2_work))),
+        "normalize_s1": lambda: processor._normalize_s1(processor._handle_nan(_copy(s1, s1_work))),
+        "prepare": lambda: _pooled_prepare(processor, s2_bytes, s1_bytes),
+        "prepare_legacy": lambda: legacy_prepare(processor, s2_bytes, s1_bytes),
+        "postprocess": lambda: processor.postprocess(output),
+    }
+    results = []
+    for stage, fn in stages.items():
+        results.append({"stage": stage, "size": size, **measure(fn, repeats)})
+        logger.info("benchmark.stage", extra=results[-1])
+    results.append({"stage": "prepare_vs_legacy", "size": size, "max_abs_diff": max_abs_diff})
+    return results
+
+
+ENCODE_PROFILES = {
+    "gtiff_raw": OutputProfile(cog=False, compression=RasterCompression.NONE),
+    "gtiff_deflate_1": OutputProfile(cog=False, compression=RasterCompression.DEFLATE, compression_level=1),
+    "cog_deflate_1": OutputProfile(compression=RasterCompression.DEFLATE, compression_level=1),
+    "cog_deflate_6": OutputProfile(compression=RasterCompression.DEFLATE, compression_level=6),
+    "cog_zstd_1": OutputProfile(compression=RasterCompression.ZSTD, compression_level=1),
+    "cog_zstd_9": OutputProfile(compression=RasterCompression.ZSTD, compression_level=9),
+    "cog_deflate_1_overviews": OutputProfile(
+        compression=RasterCompression.DEFLATE, compression_level=1, overview_levels=[2, 4, 8]
+    ),
+}
+
+
+def bench_encode(processor: ImageProcessor, size: int, repeats: int) -> list[dict[str, Any]]:
+    """Время кодирования и размер результата для профилей вывода, включая профиль из настроек"""
+    # Гладкий синтетический снимок: на шуме сжатие и предиктор ничего не дают
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    bands = np.stack([np.sin((band + 1) * 3.0 * x) * np.cos((band + 2) * 2.0 * y) for band in range(OUT_CHANNELS)])
+    image = processor.to_uint16(bands.astype(np.float32))
+
+    results = []
+    for name, profile in {"settings": processor.output_profile, **ENCODE_PROFILES}.items():
+        encoder = ImageProcessor(output_profile=profile)
+        encoded_bytes = len(encoder.encode(image))
+        results.append(
+            {
+                "stage": "encode",
+                "profile": name,
+                "size": size,
+                "encoded_bytes": encoded_bytes,
+                "ratio": image.nbytes / encoded_bytes,
+                **measure(lambda encoder=encoder: encoder.encode(image), repeats),
+            }
+        )
+        logger.info("benchmark.stage", extra=results[-1])
+    return results
+
+
+def _copy(source: np.ndarray, work: np.ndarray) -> np.ndarray:
+    np.copyto(work, source)
+    return work
+
+
+def bench_predict(
+    service: MLModelService,
+    tile_size: int,
+    threads: list[int],
+    batch_sizes: list[int],
+    repeats: int,
+) -> list[dict[str, Any]]:
+    default_threads = torch.get_num_threads()
+    rng = np.random.default_rng(2)
+    results = []
+    try:
+        for num_threads in threads:
+            torch.set_num_threads(num_threads)
+            for batch_size in batch_sizes:
+                tiles = rng.uniform(-1.0, 1.0, (batch_size, 15, tile_size, tile_size)).astype(np.float32)
+                timing = measure(lambda tiles=tiles: service.predict_batch(tiles), repeats)
+                results.append(
+                    {
+                        "stage": "predict",
+                        "threads": num_threads,
+                        "batch_size": batch_size,
+                        "tile_size": tile_size,
+                        "ms_per_tile": timing["median_ms"] / batch_size,
+                        **timing,
+                    }
+                )
+                logger.info("benchmark.stage", extra=results[-1])
+    finally:
+        torch.set_num_threads(default_threads)
+    return results
+
+
+def environment() -> dict[str, Any]:
+    commit = None
+    git = shutil.which("git")
+    if git is not None:
+        with contextlib.suppress(OSError, subprocess.CalledProcessError):
+            # Аргументы постоянные, путь к git найден через PATH
+            commit = subprocess.run(  # noqa: S603
+                [git, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "rasterio": rasterio.__version__,
+        "gdal": rasterio.__gdal_version__,
+        "precision": ModelPrecision(settings.ml_model.precision).value,
+        "optimize": settings.ml_model.optimize,
+        "channels_last": settings.ml_model.channels_last,
+    }
+
+
+def main() -> None:
+    args = _parse_args()
+    device = torch.device("cpu")
+    processor = ImageProcessor(channels_last=settings.ml_model.channels_last, output_profile=settings.output_profile)
+
+    results: list[dict[str, Any]] = []
+    for size in args.sizes:
+        results.extend(bench_processing(processor, size, args.repeats))
+        results.extend(bench_encode(processor, size, args.repeats))
+
+    service = MLModelService.build(args.weights, device) if args.weights else _random_service(device)
+    results.extend(bench_predict(service, args.tile_size, args.threads, args.batch_sizes, args.repeats))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps({"environment": environment(), "results": results}, indent=2))
+    logger.info("benchmark.saved", extra={"path": str(args.output), "results": len(results)})
+
+
+def _random_service(device: torch.device) -> MLModelService:
+    from neuro_api_context.presentation.ml.model import GeneratorUNet
+
+    model = GeneratorUNet(in_channels=15, out_channels=OUT_CHANNELS).eval()
+    return MLModelService(
+        _model=model.to(memory_format=MLModelService.memory_format_from_settings()),
+        _tiler=MLModelService.tiler_from_settings(),
+        _device=device,
+        _memory_format=MLModelService.memory_format_from_settings(),
+        _autocast=MLModelService.autocast_from_settings(),
+    )
+
+
+if __name__ == "__main__":
+    main()
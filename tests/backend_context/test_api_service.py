@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from backend_context.persistent.pg.api import ImageProcessing
+from backend_context.schemas.api_schemas import Task
+from backend_context.services.api_service import ApiService
+from backend_context.services.task_event_hub import TaskEventHub
+from backend_context.services.task_router import TaskRouter
+
+
+class _S3Repository:
+    async def get_uploaded_images(self, task_id: uuid.UUID, header_bytes: int) -> tuple[bytes, int]:
+        return b"", 1024
+
+
+class _ApiRepository:
+    def __init__(self):
+        self.tasks: dict[uuid.UUID, ImageProcessing] = {}
+        self.claimed: set[uuid.UUID] = set()
+        self.published: set[uuid.UUID] = set()
+
+    async def add_task(self, task_id: uuid.UUID) -> bool:
+        if task_id in self.tasks:
+            return False
+        self.tasks[task_id] = ImageProcessing.QUEUED
+        self.claimed.add(task_id)
+        return True
+
+    async def claim_publish(self, task_id: uuid.UUID, lease: timedelta) -> bool:
+        if self.tasks[task_id] != ImageProcessing.QUEUED or task_id in self.published | self.claimed:
+            return False
+        self.claimed.add(task_id)
+        return True
+
+    async def finish_publish(self, task_id: uuid.UUID, published: bool) -> None:
+        if published:
+            self.published.add(task_id)
+        else:
+            self.claimed.discard(task_id)
+
+    async def get_task_by_id(self, task_id: uuid.UUID, from_primary: bool = False) -> Task:
+        return Task(task_id=task_id, status=self.tasks[task_id], s3_url=None)
+
+
+class _Publisher:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.published: list[str] = []
+
+    async def publish(self, message: str, **_: object) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("broker is unavailable")
+        self.published.append(message)
+
+
+def _service(repository: _ApiRepository, publisher: _Publisher) -> ApiService:
+    return ApiService(
+        _s3_supplier=None,
+        _api_repository=repository,
+        _s3_repository=_S3Repository(),
+        _publisher=publisher,
+        _task_router=TaskRouter.from_settings(),
+        _event_hub=TaskEventHub(queue_size=1),
+    )
+
+
+def test_confirm_retry_publishes_task_left_queued() -> None:
+    repository, publisher = _ApiRepository(), _Publisher(failures=1)
+    service = _service(repository, publisher)
+    task_id = uuid.uuid4()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(service.confirm_upload(task_id))
+    task = asyncio.run(service.confirm_upload(task_id))
+
+    assert ImageProcessing(task.status) == ImageProcessing.QUEUED
+    assert publisher.published == [str(task_id)]
+
+
+def test_confirm_does_not_requeue_task_in_work() -> None:
+    repository, publisher = _ApiRepository(), _Publisher(failures=0)
+    service = _service(repository, publisher)
+    task_id = uuid.uuid4()
+    asyncio.run(service.confirm_upload(task_id))
+    repository.tasks[task_id] = ImageProcessing.PROCESSING
+
+    task = asyncio.run(service.confirm_upload(task_id))
+
+    assert ImageProcessing(task.status) == ImageProcessing.PROCESSING
+    assert publisher.published == [str(task_id)]
+
+
+def test_repeated_confirm_publishes_once() -> None:
+    repository, publisher = _ApiRepository(), _Publisher(failures=0)
+    service = _service(repository, publisher)
+    task_id = uuid.uuid4()
+
+    asyncio.run(service.confirm_upload(task_id))
+    task = asyncio.run(service.confirm_upload(task_id))
+
+    assert ImageProcessing(task.status) == ImageProcessing.QUEUED
+    assert publisher.published == [str(task_id)]
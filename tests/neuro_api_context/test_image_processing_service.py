@@ -0,0 +1,86 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from rasterio.io import MemoryFile
+
+from base.settings import OutputProfile, RasterCompression
+from neuro_api_context.services.image_processing_service import ImageProcessor
+
+
+def _geotiff(channels: int, height: int = 32, width: int = 32) -> bytes:
+    data = np.random.default_rng(channels).uniform(0, 3000, size=(channels, height, width)).astype(np.float32)
+    with MemoryFile() as memfile:
+        with memfile.open(driver="GTiff", height=height, width=width, count=channels, dtype="float32") as dst:
+            dst.write(data)
+        return memfile.read()
+
+
+def test_prepare_runs_in_process_pool() -> None:
+    processor = ImageProcessor()
+    s2, s1 = _geotiff(13), _geotiff(2)
+    # Пул буферов не пустой: его содержимое не должно уходить в дочерний процесс
+    processor.release(processor.prepare(s2, s1))
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+        scene = executor.submit(processor.prepare, s2, s1).result()
+
+    np.testing.assert_array_equal(scene, processor.prepare(s2, s1))
+
+
+def test_oversized_buffer_is_not_pooled() -> None:
+    processor = ImageProcessor(max_pooled_bytes=1024**2, max_pooled_buffer_bytes=15 * 16 * 16 * 4)
+    small = np.empty((15, 16, 16), dtype=np.float32)
+    large = np.empty((15, 32, 32), dtype=np.float32)
+
+    processor.release(small)
+    processor.release(large)
+
+    assert processor._acquire_buffer(small.shape) is small
+    assert processor._acquire_buffer(large.shape) is not large
+
+
+def test_pool_is_bounded_by_bytes() -> None:
+    buffer_bytes = 15 * 16 * 16 * 4
+    processor = ImageProcessor(max_pooled_bytes=2 * buffer_bytes, max_pooled_buffer_bytes=buffer_bytes)
+    buffers = [np.empty((15, 16, 16), dtype=np.float32) for _ in range(3)]
+
+    for buffer in buffers:
+        processor.release(buffer)
+
+    # Самый старый буфер вытеснен, два последних укладываются в лимит
+    pooled = [processor._acquire_buffer((15, 16, 16)) for _ in range(3)]
+    assert pooled[0] is buffers[1]
+    assert pooled[1] is buffers[2]
+    assert all(buffer is not pooled[2] for buffer in buffers)
+
+
+def test_disabled_pool_keeps_no_buffers() -> None:
+    processor = ImageProcessor(max_pooled_bytes=0)
+
+    processor.release(np.empty((15, 16, 16), dtype=np.float32))
+
+    assert processor._pooled_buffers == []
+
+
+def test_small_scene_is_not_tiled() -> None:
+    processor = ImageProcessor(output_profile=OutputProfile(compression=RasterCompression.NONE))
+    image = np.ones((2, 64, 64), dtype=np.uint16)
+
+    encoded = processor.encode(image)
+
+    assert len(encoded) < 4 * image.nbytes
+    with MemoryFile(encoded) as memfile, memfile.open() as src:
+        assert not src.profile["tiled"]
+        np.testing.assert_array_equal(src.read(), image)
+
+
+def test_large_scene_is_written_as_cog() -> None:
+    processor = ImageProcessor(output_profile=OutputProfile(block_size=256, overview_levels=[2]))
+    image = np.arange(2 * 512 * 512, dtype=np.uint16).reshape(2, 512, 512)
+
+    with MemoryFile(processor.encode(image)) as memfile, memfile.open() as src:
+        assert src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+        assert src.block_shapes[0] == (256, 256)
+        assert src.overviews(1) == [2]
+        np.testing.assert_array_equal(src.read(), image)
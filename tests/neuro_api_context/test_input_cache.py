@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from neuro_api_context.repositories.input_cache import InputCache
+
+
+def test_pinned_entry_is_not_evicted_until_released(tmp_path: Path) -> None:
+    cache = InputCache(tmp_path, max_size_bytes=4)
+    pinned = cache.put("optical.tif", "a", b"1234")
+    other = cache.put("sar.tif", "b", b"5678")
+
+    assert pinned.exists()
+
+    cache.release(pinned)
+
+    assert not pinned.exists()
+    assert other.exists()
+    assert cache.stats()["size_bytes"] == 4
+
+
+def test_hit_pins_entry(tmp_path: Path) -> None:
+    cache = InputCache(tmp_path, max_size_bytes=4)
+    cache.release(cache.put("optical.tif", "a", b"1234"))
+    path = cache.get("optical.tif", "a")
+
+    cache.release(cache.put("sar.tif", "b", b"5678"))
+
+    assert path is not None
+    assert path.exists()
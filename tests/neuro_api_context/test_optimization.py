@@ -0,0 +1,21 @@
+import hashlib
+import os
+from pathlib import Path
+
+from neuro_api_context.ml.optimization import weights_digest
+
+
+def test_weights_digest_is_reused_until_weights_change(tmp_path: Path) -> None:
+    weights = tmp_path / "gen.pth"
+    weights.write_bytes(b"v1")
+    assert weights_digest(str(weights)) == hashlib.sha256(b"v1").hexdigest()
+
+    # Подменённый в кэше хэш возвращается, пока размер и mtime весов те же
+    sidecar = tmp_path / "gen.pth.sha256"
+    sidecar.write_text(sidecar.read_text().replace(hashlib.sha256(b"v1").hexdigest(), "cached"))
+    assert weights_digest(str(weights)) == "cached"
+
+    stat = weights.stat()
+    weights.write_bytes(b"v2")
+    os.utime(weights, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert weights_digest(str(weights)) == hashlib.sha256(b"v2").hexdigest()
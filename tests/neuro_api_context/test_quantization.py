@@ -0,0 +1,13 @@
+from pathlib import Path
+
+from neuro_api_context.ml.quantization import quantized_model_path
+
+
+def test_quantized_model_path_changes_with_weights(tmp_path: Path) -> None:
+    weights = tmp_path / "gen.pth"
+    weights.write_bytes(b"v1")
+    first = quantized_model_path(str(weights))
+
+    weights.write_bytes(b"v2 weights")
+
+    assert quantized_model_path(str(weights)) != first
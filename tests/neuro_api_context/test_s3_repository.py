@@ -0,0 +1,36 @@
+import asyncio
+from pathlib import Path
+
+import botocore.exceptions
+
+from neuro_api_context.repositories.input_cache import InputCache
+from neuro_api_context.repositories.s3_repository import S3Repository
+
+
+class _OverwrittenTransfer:
+    """Объект перезаписывается между первыми HEAD и GET"""
+
+    def __init__(self):
+        self.etag = '"old"'
+        self.content = b"old"
+
+    async def head(self, key: str) -> dict[str, str]:
+        return {"ETag": self.etag}
+
+    async def get(self, key: str, if_match: str | None = None) -> bytes:
+        if self.etag == '"old"':
+            self.etag, self.content = '"new"', b"new"
+        if if_match is not None and if_match != self.etag:
+            raise botocore.exceptions.ClientError({"Error": {"Code": "PreconditionFailed"}}, "GetObject")
+        return self.content
+
+
+def test_object_overwritten_after_head_is_cached_under_its_etag(tmp_path: Path) -> None:
+    cache = InputCache(tmp_path, max_size_bytes=1024)
+    repository = S3Repository(_s3_transfer=_OverwrittenTransfer(), _input_cache=cache)
+
+    path = asyncio.run(repository._download_cached("optical.tif", cache))
+    cache.release(path)
+
+    assert path.read_bytes() == b"new"
+    assert cache.get("optical.tif", "old") is None
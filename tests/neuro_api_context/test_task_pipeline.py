@@ -0,0 +1,42 @@
+import asyncio
+import uuid
+
+from neuro_api_context.services.task_pipeline import PipelineStage, TaskPipeline
+
+
+def test_state_of_cancelled_task_is_discarded() -> None:
+    async def run() -> list[str]:
+        prepared = asyncio.Event()
+        proceed = asyncio.Event()
+        discarded: list[str] = []
+
+        async def prepare(task_id: uuid.UUID) -> str:
+            prepared.set()
+            await proceed.wait()
+            return "scene"
+
+        async def predict(state: str) -> None:
+            raise AssertionError("Cancelled task must not be predicted")
+
+        async def discard(state: str) -> None:
+            discarded.append(state)
+
+        pipeline = TaskPipeline(
+            stages=[
+                PipelineStage(name="prepare", run=prepare, workers=1),
+                PipelineStage(name="predict", run=predict, workers=1, discard=discard),
+            ],
+            queue_size=1,
+        )
+        pipeline.start()
+        handler = asyncio.create_task(pipeline.submit(uuid.uuid4()))
+        await prepared.wait()
+        # Обработчик сообщения отменён, пока задача в первой стадии
+        handler.cancel()
+        proceed.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await pipeline.close()
+        return discarded
+
+    assert asyncio.run(run()) == ["scene"]
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from backend_context.persistent.pg.api import ImageProcessing
+from neuro_api_context.repositories.db_repository import TaskStatusUpdate
+from neuro_api_context.services.task_status_writer import TaskStatusWriter
+
+
+class _FlakyRepository:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.written: list[list[TaskStatusUpdate]] = []
+
+    async def update_task_statuses(self, updates: list[TaskStatusUpdate]) -> set[uuid.UUID]:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is unavailable")
+        self.written.append(updates)
+        return {update.task_id for update in updates}
+
+
+def _writer(repository: _FlakyRepository, max_attempts: int) -> TaskStatusWriter:
+    return TaskStatusWriter(
+        repository,
+        max_batch_size=10,
+        flush_interval=timedelta(milliseconds=1),
+        max_attempts=max_attempts,
+        retry_delay=timedelta(milliseconds=20),
+    )
+
+
+def test_failed_flush_is_retried_and_keeps_ready() -> None:
+    async def run() -> tuple[bool, bool, list[list[TaskStatusUpdate]]]:
+        repository = _FlakyRepository(failures=2)
+        writer = _writer(repository, max_attempts=5)
+        task_id = uuid.uuid4()
+        ready = asyncio.create_task(writer.update(task_id, ImageProcessing.READY))
+        await asyncio.sleep(0.01)
+        # Запоздавший PROCESSING приходит, пока READY ждёт повтора, и не заменяет его
+        processing = asyncio.create_task(writer.update(task_id, ImageProcessing.PROCESSING))
+        results = await asyncio.gather(ready, processing)
+        await writer.close()
+        return *results, repository.written
+
+    ready, processing, written = asyncio.run(run())
+
+    assert ready
+    assert processing
+    assert [[update.status for update in batch] for batch in written] == [[ImageProcessing.READY]]
+
+
+def test_flush_fails_after_max_attempts() -> None:
+    async def run() -> BaseException | bool:
+        writer = _writer(_FlakyRepository(failures=3), max_attempts=3)
+        try:
+            return await writer.update(uuid.uuid4(), ImageProcessing.READY)
+        except ConnectionError as e:
+            return e
+        finally:
+            await writer.close()
+
+    assert isinstance(asyncio.run(run()), ConnectionError)
+
+
+def test_stats_are_logged_while_running(caplog: pytest.LogCaptureFixture) -> None:
+    async def run() -> None:
+        writer = TaskStatusWriter(
+            _FlakyRepository(failures=0),
+            max_batch_size=10,
+            flush_interval=timedelta(milliseconds=1),
+            stats_interval=timedelta(0),
+        )
+        await writer.update(uuid.uuid4(), ImageProcessing.PROCESSING)
+        await writer.update(uuid.uuid4(), ImageProcessing.READY)
+
+    with caplog.at_level(logging.INFO, logger="neuro_api_context.services.task_status_writer"):
+        asyncio.run(run())
+
+    stats = [record for record in caplog.records if record.message == "task.status.writer.stats"]
+    assert len(stats) == 2
+    assert stats[-1].flushes == 2
+    assert stats[-1].avg_batch_size == 1.0